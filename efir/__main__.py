@@ -29,24 +29,47 @@ parser.add_argument('-v', '--verbose', action='store_true',
                     help="be verbose")
 parser.add_argument('-s', '--strict', action='store_true',
                     help="do not cleanup and autocomplete model")
+parser.add_argument('-f', '--force', action='store_true',
+                    help="process even if the inputs did not change")
+parser.add_argument('-o', '--format', choices=sorted(EXTENSIONS),
+                    default='xml', help="output format (default: xml)")
 parser.add_argument('-l', '--list', action='store_true',
                     help="list known repositories")
+parser.add_argument('-a', '--all', action='store_true',
+                    help="process all repositories in parallel")
+parser.add_argument('-j', '--jobs', type=int, metavar='N',
+                    help="process at most N repositories at once with --all")
+parser.add_argument('-t', '--ttl', type=float, metavar='SECONDS',
+                    help="revalidate cached downloads older than SECONDS")
 parser.add_argument('repository', nargs='?',
                     help="repository to process")
 args = parser.parse_args()
 
+if args.jobs is not None and not args.all:
+    parser.error("--jobs requires --all")
+if args.repository and args.all:
+    parser.error("a repository cannot be given with --all")
+
 logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO,
-                    format="[%(asctime)s] %(levelname)s %(message)s")
+                    format=LOG_FORMAT)
+
+set_cache_ttl(args.ttl)
 
 if args.list:
     for name in sorted(processors.keys()):
         print(name)
     parser.exit(0)
 
+if args.all:
+    results = process_all(strict=args.strict, force=args.force,
+                          format=args.format, max_workers=args.jobs)
+    parser.exit(0 if all(results.values()) else 1)
+
 if not args.repository:
     parser.print_help()
     parser.exit(0)
 
 if args.repository not in processors:
     parser.error("Unknown repository")
-processors[args.repository].process(strict=args.strict)
+processors[args.repository].process(strict=args.strict, force=args.force,
+                                    format=args.format)
@@ -20,17 +20,38 @@
 
 import logging
 import os.path
-import shutil
+import collections
+import hashlib
+import sqlite3
+import tempfile
+import threading
+import io
+import http.client
 import urllib.request
 import urllib.parse
 import urllib.error
 import email.utils
+import time
 import csv
+import concurrent.futures
 
 CACHE_DIR = "cache"
 DATA_DIR = "data"
 OUT_DIR = "output"
 
+# Default number of concurrent downloads
+MAX_WORKERS = 8
+
+# Default number of concurrent downloads from the same host
+MAX_PER_HOST = 4
+
+# Default time (in seconds) after which a cached download is revalidated, or
+# None to keep cached downloads forever
+CACHE_TTL = None
+
+# HTTP statuses recorded as dead links
+DEAD_STATUSES = {403, 404, 503}
+
 
 def set_current_module(name):
     '''Set the currently executing module name to name.'''
@@ -40,6 +61,11 @@ def set_current_module(name):
     else:
         del CURRENT_MODULE
 
+def set_cache_ttl(ttl):
+    '''Set the default time to live (in seconds) of cached downloads.'''
+    global CACHE_TTL
+    CACHE_TTL = ttl
+
 class module_context:
 
     '''Context manager to set the currently executing module.'''
@@ -59,7 +85,8 @@ def is_url(name):
     return name.startswith('http://') or name.startswith('https://')
 
 def get_filename(name):
-    '''Return the filename associated to name (a data file or URL).'''
+    '''Return the filename associated to name (a data file or URL). For a URL,
+    this is its location in the legacy (one file per URL) cache layout.'''
     global CURRENT_MODULE
     if is_url(name):
         return os.path.join(CACHE_DIR, CURRENT_MODULE,
@@ -67,27 +94,297 @@ def get_filename(name):
     else:
         return os.path.join(DATA_DIR, CURRENT_MODULE, name)
 
-def urlopen_cache(url, binary=True):
-    '''Download url, if not yet in cache, and return a file object.'''
+
+## Cache index
+#
+# Downloaded URLs are recorded in an SQLite database holding, for each URL, the
+# HTTP status, headers and fetch time, and the name of the blob holding the
+# body. Blobs are content-addressed files in the blobs directory.
+
+CACHE_INDEX = os.path.join(CACHE_DIR, "index.sqlite")
+BLOB_DIR = os.path.join(CACHE_DIR, "blobs")
+
+CACHE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+  url TEXT PRIMARY KEY,
+  status INTEGER,
+  blob TEXT,
+  etag TEXT,
+  modified TEXT,
+  fetched REAL
+);
+"""
+
+CacheEntry = collections.namedtuple('CacheEntry',
+        ['status', 'blob', 'etag', 'modified', 'fetched'])
+
+_connections = threading.local()
+
+def connect_db(filename, schema):
+    '''Return a connection to the SQLite database filename for the current
+    thread and process, creating the database with schema if needed.'''
+    key = (os.getpid(), filename)
+    connections = _connections.__dict__.setdefault('connections', {})
+    if key not in connections:
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        db = sqlite3.connect(filename, timeout=60, isolation_level=None)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.executescript(schema)
+        connections[key] = db
+    return connections[key]
+
+def get_blob_filename(blob):
+    '''Return the filename of blob.'''
+    return os.path.join(BLOB_DIR, blob[:2], blob)
+
+def store_blob(f):
+    '''Store the content of the file object f and return its blob name.'''
+    os.makedirs(BLOB_DIR, exist_ok=True)
+    digest = hashlib.sha1()
+    # Write to a temporary file first so that concurrent readers never
+    # see a partial download
+    fd, tmpname = tempfile.mkstemp(dir=BLOB_DIR)
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            for chunk in iter(lambda: f.read(65536), b''):
+                digest.update(chunk)
+                out.write(chunk)
+    except:
+        os.remove(tmpname)
+        raise
+    blob = digest.hexdigest()
+    os.makedirs(os.path.dirname(get_blob_filename(blob)), exist_ok=True)
+    os.replace(tmpname, get_blob_filename(blob))
+    return blob
+
+def get_entry(url):
+    '''Return the CacheEntry of url or None if url is unknown.'''
+    db = connect_db(CACHE_INDEX, CACHE_SCHEMA)
+    row = db.execute("SELECT status, blob, etag, modified, fetched "
+                     "FROM entries WHERE url = ?", (url,)).fetchone()
+    if row is None:
+        return import_legacy_entry(url)
+    return CacheEntry(*row)
+
+def update_entry(url, **fields):
+    '''Update the given fields (see CacheEntry) of the cache entry of url.'''
+    db = connect_db(CACHE_INDEX, CACHE_SCHEMA)
+    names = sorted(fields)
+    with db:
+        db.execute("BEGIN IMMEDIATE")
+        db.execute("INSERT OR IGNORE INTO entries (url) VALUES (?)", (url,))
+        db.execute("UPDATE entries SET " +
+                   ", ".join(name + " = ?" for name in names) +
+                   " WHERE url = ?",
+                   [fields[name] for name in names] + [url])
+
+def import_legacy_entry(url):
+    '''Import url from the legacy cache layout of the current module into the
+    cache index. Return the new CacheEntry or None if url was not cached.'''
     cname = get_filename(url)
-    if not os.path.exists(cname):
+    fields = {}
+    if os.path.exists(cname):
+        with open(cname, 'rb') as f:
+            fields['blob'] = store_blob(f)
+        fields['fetched'] = os.path.getmtime(cname)
+        fields['status'] = 200
+    elif os.path.exists(cname + '=found'):
+        fields['fetched'] = os.path.getmtime(cname + '=found')
+        fields['status'] = 200
+    elif os.path.exists(cname + '=notfound'):
+        fields['fetched'] = os.path.getmtime(cname + '=notfound')
+        fields['status'] = 404
+    for suffix in ['modified', 'etag']:
+        if os.path.exists(cname + '=' + suffix):
+            with open(cname + '=' + suffix, 'r') as f:
+                fields[suffix] = f.read().strip()
+            fields['status'] = fields.get('status', 200)
+            fields.setdefault('fetched',
+                              os.path.getmtime(cname + '=' + suffix))
+    if not fields:
+        return None
+    logging.debug("Importing %s from the legacy cache.", url)
+    update_entry(url, **fields)
+    return get_entry(url)
+
+
+## HTTP client
+#
+# Connections are kept alive and reused for all requests to the same host.
+# Each thread has its own connections, as they cannot be shared.
+
+HTTP_TIMEOUT = 60
+MAX_REDIRECTS = 10
+
+# Headers sent with every request, as urllib.request would
+DEFAULT_HEADERS = {"User-Agent": "Python-urllib/" + urllib.request.__version__}
+
+def get_connection(scheme, netloc):
+    '''Return the persistent connection to netloc for the current thread and
+    process.'''
+    key = (os.getpid(), scheme, netloc)
+    connections = _connections.__dict__.setdefault('http', {})
+    if key not in connections:
+        if scheme == 'https':
+            conn = http.client.HTTPSConnection(netloc, timeout=HTTP_TIMEOUT)
+        else:
+            conn = http.client.HTTPConnection(netloc, timeout=HTTP_TIMEOUT)
+        connections[key] = conn
+    return connections[key]
+
+def send_request(scheme, netloc, method, path, headers):
+    '''Send a request on the persistent connection to netloc and return the
+    response. The request is retried once on a fresh connection if the
+    server has closed the previous one.'''
+    conn = get_connection(scheme, netloc)
+    for attempt in range(2):
+        try:
+            conn.request(method, path, headers=headers)
+            return conn.getresponse()
+        except (http.client.HTTPException, ConnectionError) as e:
+            conn.close()
+            if attempt:
+                raise urllib.error.URLError(e)
+        except OSError as e:
+            conn.close()
+            raise urllib.error.URLError(e)
+
+def http_request(url, method='GET', headers={}):
+    '''Request url with a pooled connection, following redirects, and return
+    the http.client.HTTPResponse. The body of the response must be read
+    entirely before the next request to the same host. Like
+    urllib.request.urlopen, raise urllib.error.HTTPError if the response is
+    not successful.'''
+    headers = dict(DEFAULT_HEADERS, **headers)
+    for i in range(MAX_REDIRECTS + 1):
+        parts = urllib.parse.urlsplit(url)
+        if urllib.request.getproxies().get(parts.scheme):
+            request = urllib.request.Request(url, method=method,
+                                             headers=headers)
+            return urllib.request.urlopen(request, timeout=HTTP_TIMEOUT)
+        path = urllib.parse.urlunsplit(('', '', parts.path or '/',
+                                        parts.query, ''))
+        response = send_request(parts.scheme, parts.netloc, method, path,
+                                headers)
+        if response.status in {301, 302, 303, 307, 308} and \
+           'Location' in response.headers:
+            response.read()
+            url = urllib.parse.urljoin(url, response.headers['Location'])
+            continue
+        if not 200 <= response.status < 300:
+            body = io.BytesIO(response.read())
+            raise urllib.error.HTTPError(url, response.status,
+                                         response.reason, response.headers,
+                                         body)
+        return response
+    raise urllib.error.HTTPError(url, response.status, "Too many redirects",
+                                 response.headers, None)
+
+
+def start_recording():
+    '''Start recording the URLs opened with urlopen_cache or get_modified.'''
+    global RECORDED_URLS
+    RECORDED_URLS = set()
+
+def get_recorded_urls():
+    '''Return the sorted list of URLs recorded since start_recording.'''
+    return sorted(RECORDED_URLS)
+
+def record_url(url):
+    '''Record that url is an input of the current run.'''
+    if 'RECORDED_URLS' in globals():
+        RECORDED_URLS.add(url)
+
+def get_url_fingerprint(url):
+    '''Return a string identifying the cached version of url. A cached body
+    or cached headers are revalidated first if their time to live has
+    expired.'''
+    entry = get_entry(url)
+    if entry is not None and entry.blob is not None:
+        urlopen_cache(url).close()
+        entry = get_entry(url)
+    elif entry is not None:
+        try:
+            get_headers_modified(url)
+        except urllib.error.URLError as e:
+            # Dead links are recorded, and change the fingerprint
+            logging.debug("Unable to fetch headers of %s: %s.", url, e)
+        entry = get_entry(url)
+    if entry is None:
+        return url + " unknown"
+    return " ".join([url, str(entry.status), str(entry.blob),
+                     str(entry.etag), str(entry.modified)])
+
+
+def is_stale(entry, ttl=None):
+    '''Return True if the cache entry is older than ttl seconds (defaults to
+    CACHE_TTL) and must be revalidated.'''
+    if ttl is None:
+        ttl = CACHE_TTL
+    if ttl is None:
+        return False
+    return entry.fetched is None or time.time() - entry.fetched > ttl
+
+def download(url, entry=None):
+    '''Download url into the cache and return its new CacheEntry.
+
+    If the current cache entry is given, the request is conditional on its
+    ETag and modification date. If the server answers that the resource has
+    not been modified, the cache entry is only marked as fresh.
+    '''
+    headers = {"Accept": "*/*"}
+    if entry is not None:
+        logging.debug("Revalidating %s.", url)
+        if entry.etag:
+            headers["If-None-Match"] = entry.etag
+        if entry.modified:
+            headers["If-Modified-Since"] = entry.modified
+    else:
         logging.debug("Downloading %s.", url)
-        request = urllib.request.Request(url, headers={"Accept": "*/*"})
-        response = urllib.request.urlopen(request)
-        os.makedirs(os.path.dirname(cname), exist_ok=True)
-        with open(cname, 'wb') as f:
-            shutil.copyfileobj(response, f)
-        if 'Last-Modified' in response.headers:
-            mtime = response.headers['Last-Modified']
-            with open(cname + '=modified', 'w') as f:
-                f.write(mtime)
-    logging.debug("Opening %s.", cname)
-    return open(cname, 'rb' if binary else 'r')
-
-def open_data(name, binary=True):
-    '''Open a data file or URL (if it begins with http).'''
+    try:
+        response = http_request(url, headers=headers)
+    except urllib.error.HTTPError as e:
+        if entry is not None and e.code == 304:
+            update_entry(url, fetched=time.time())
+            return entry._replace(fetched=time.time())
+        raise e
+    fields = {'status': response.status,
+              'blob': store_blob(response),
+              'etag': response.headers['ETag'],
+              'fetched': time.time()}
+    if entry is not None or 'Last-Modified' in response.headers:
+        fields['modified'] = response.headers['Last-Modified']
+    update_entry(url, **fields)
+    return get_entry(url)
+
+def urlopen_cache(url, binary=True, ttl=None):
+    '''Download url, if not yet in cache, and return a file object.
+
+    Arguments:
+    url -- the URL to open
+    binary -- if True, open the file in binary mode
+    ttl -- the time (in seconds) after which the cached copy is revalidated;
+           defaults to CACHE_TTL
+    '''
+    record_url(url)
+    entry = get_entry(url)
+    if entry is None or entry.blob is None:
+        entry = download(url)
+    elif is_stale(entry, ttl):
+        try:
+            entry = download(url, entry)
+        except urllib.error.URLError as e:
+            logging.warning("Unable to revalidate %s, using cached copy: %s.",
+                            url, e)
+    filename = get_blob_filename(entry.blob)
+    logging.debug("Opening %s for %s.", filename, url)
+    return open(filename, 'rb' if binary else 'r')
+
+def open_data(name, binary=True, ttl=None):
+    '''Open a data file or URL (if it begins with http). See urlopen_cache for
+    the meaning of ttl.'''
     if is_url(name):
-        return urlopen_cache(name, binary)
+        return urlopen_cache(name, binary, ttl)
     else:
         filename = get_filename(name)
         logging.debug("Opening %s.", filename)
@@ -96,48 +393,151 @@ def open_data(name, binary=True):
 def get_modified(name):
     '''Return a datetime.datetime object with the last modification date of
     name (a data file or URL) or None if unknown.'''
-    filename = get_filename(name) + '=modified'
-    if not os.path.exists(filename):
-        if is_url(name):
-            logging.debug("Fetching headers of %s.", name)
-            request = urllib.request.Request(name, method='HEAD',
-                                             headers={"Accept": "*/*"})
-            response = urllib.request.urlopen(request)
-            if 'Last-Modified' in response.headers:
-                mtime = response.headers['Last-Modified']
-                os.makedirs(os.path.dirname(filename), exist_ok=True)
-                with open(filename, 'w') as f:
-                    f.write(mtime)
-            else:
-                return None
-        else:
-            return None
-    with open(filename, 'r') as f:
-        return email.utils.parsedate_to_datetime(f.read().strip())
+    if not is_url(name):
+        return None
+    record_url(name)
+    return get_headers_modified(name)
+
+def get_headers_modified(name):
+    '''Like get_modified for the URL name, but without recording it.'''
+    entry = get_entry(name)
+    if entry is None or entry.status is None or entry.status >= 400:
+        entry = fetch_headers(name, entry)
+    elif is_stale(entry):
+        try:
+            entry = fetch_headers(name, entry)
+        except urllib.error.URLError as e:
+            logging.warning("Unable to revalidate %s, using cached headers: "
+                            "%s.", name, e)
+            entry = get_entry(name)
+    if entry.modified is None:
+        return None
+    return email.utils.parsedate_to_datetime(entry.modified)
+
+def fetch_headers(name, entry=None):
+    '''Fetch the headers of the URL name and return its new CacheEntry.
+
+    If the current cache entry is given and has a cached body, the body is
+    revalidated instead (see download), so that its fetch time remains
+    accurate. Raise urllib.error.HTTPError if the URL is not accessible; the
+    statuses of dead links are recorded in the cache.
+    '''
+    try:
+        if entry is not None and entry.blob is not None:
+            return download(name, entry)
+        logging.debug("Fetching headers of %s.", name)
+        response = http_request(name, method='HEAD',
+                                headers={"Accept": "*/*"})
+    except urllib.error.HTTPError as e:
+        if e.code in DEAD_STATUSES:
+            update_entry(name, status=e.code, fetched=time.time())
+        raise e
+    response.read()
+    fields = {'status': response.status, 'fetched': time.time()}
+    if entry is not None or 'Last-Modified' in response.headers:
+        fields['modified'] = response.headers['Last-Modified']
+    update_entry(name, **fields)
+    return get_entry(name)
 
 def is_alive(name):
-    '''Return True if the data file name exists or the url name is alive.'''
-    filename = get_filename(name)
+    '''Return True if the data file name exists or the url name is alive.
+    The status of a URL is checked again once its time to live has expired
+    (see CACHE_TTL).'''
     if is_url(name):
-        if os.path.exists(filename + "=notfound"):
-            return False
-        if os.path.exists(filename) or \
-           os.path.exists(filename + "=found") or \
-           os.path.exists(filename + "=modified"):
-            return True
-        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        entry = get_entry(name)
+        if entry is not None and entry.status is not None and \
+           not is_stale(entry):
+            return entry.status < 400
         try:
-            get_modified(name)
-            open(filename + "=found", 'w').close()
+            fetch_headers(name, entry)
             return True
         except urllib.error.HTTPError as e:
-            if e.code in {404, 403, 503}:
-                open(filename + "=notfound", 'w').close()
+            if e.code in DEAD_STATUSES:
                 return False
             else:
                 raise e
     else:
-        return os.path.exists(filename)
+        return os.path.exists(get_filename(name))
+
+def map_hosts(func, urls, max_workers=MAX_WORKERS, max_per_host=MAX_PER_HOST):
+    '''Call func on each of urls in a thread pool and yield (url, future)
+    pairs as the calls complete.
+
+    The calls for the same host are queued and submitted at most max_per_host
+    at a time, starting with each host in turn, so that the calls waiting for
+    a busy host never occupy a worker and other hosts are not held up.
+
+    Arguments:
+    func -- the function of a URL
+    urls -- an iterable of URLs
+    max_workers -- the maximum number of concurrent calls
+    max_per_host -- the maximum number of concurrent calls per host
+    '''
+    queues = collections.OrderedDict()
+    for url in sorted(urls):
+        host = urllib.parse.urlsplit(url).netloc
+        queues.setdefault(host, collections.deque()).append(url)
+    with concurrent.futures.ThreadPoolExecutor(max_workers) as executor:
+        running = {}
+        def submit(host):
+            url = queues[host].popleft()
+            running[executor.submit(func, url)] = (host, url)
+        for i in range(max_per_host):
+            for host, queue in queues.items():
+                if queue:
+                    submit(host)
+        while running:
+            done, pending = concurrent.futures.wait(running,
+                    return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                host, url = running.pop(future)
+                if queues[host]:
+                    submit(host)
+                yield url, future
+
+def prefetch(urls, max_workers=MAX_WORKERS, headers_only=False,
+             max_per_host=MAX_PER_HOST):
+    '''Fill the cache with urls using concurrent downloads.
+
+    Errors are logged and otherwise ignored: they will be raised again when
+    the url is actually opened.
+
+    Arguments:
+    urls -- an iterable of URLs (non-URL names are ignored)
+    max_workers -- the maximum number of concurrent downloads
+    headers_only -- if True, only fetch the headers (see get_modified)
+    max_per_host -- the maximum number of concurrent downloads per host
+    '''
+    urls = {str(url) for url in urls if is_url(str(url))}
+    if not urls:
+        return
+    logging.debug("Prefetching %d URLs.", len(urls))
+    if headers_only:
+        fetch = get_modified
+    else:
+        fetch = lambda url: urlopen_cache(url).close()
+    for url, future in map_hosts(fetch, urls, max_workers, max_per_host):
+        if future.exception() is not None:
+            logging.debug("Unable to prefetch %s: %s.", url,
+                          future.exception())
+
+def check_alive(names, max_workers=MAX_WORKERS, max_per_host=MAX_PER_HOST):
+    '''Check concurrently whether names are alive (see is_alive).
+    Return a dictionary mapping each name to True or False. Names that could
+    not be checked because of an error are left out.'''
+    alive = {}
+    names = set(names)
+    if not names:
+        return alive
+    logging.debug("Checking %d links.", len(names))
+    for name, future in map_hosts(is_alive, names, max_workers,
+                                  max_per_host):
+        if future.exception() is None:
+            alive[name] = future.result()
+        else:
+            logging.debug("Unable to check %s: %s.", name,
+                          future.exception())
+    return alive
 
 def read_csv(name):
     '''Read a CSV file. The first row contains the column names. Yield the data
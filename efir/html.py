@@ -20,22 +20,90 @@
 
 import bs4
 import re
+import functools
+import datetime
 from .files import *
 
+from bs4 import SoupStrainer
 from urllib.parse import urlparse, urljoin, unquote
 
+# Parsers by order of preference
+PARSERS = ['lxml', 'html5lib', 'html.parser']
+
+
+def get_default_parser():
+    '''Return the name of the fastest available parser.'''
+    if not hasattr(get_default_parser, 'parser'):
+        get_default_parser.parser = next(
+            parser for parser in PARSERS
+            if bs4.builder.builder_registry.lookup(parser))
+    return get_default_parser.parser
+
+
+def class_strainer(cls, name=None):
+    '''Return a SoupStrainer matching the tags having class cls, among other
+    classes.'''
+    return SoupStrainer(name, class_=re.compile(r"(?:^|\s)" + re.escape(cls) +
+                                                r"(?:\s|$)"))
+
+
 class HTMLPage(bs4.BeautifulSoup):
 
     '''A specialized BeautifulSoup.'''
 
-    def __init__(self, url):
-        '''Load a web page located at url.'''
+    def __init__(self, url, parser=None, parse_only=None):
+        '''Load a web page located at url.
+
+        Arguments:
+        url -- the URL of the page
+        parser -- the name of the parser (see PARSERS), by default the
+                  fastest available one
+        parse_only -- a SoupStrainer restricting the parsed part of the page
+        '''
         self.url = url
-        bs4.BeautifulSoup.__init__(self, open_data(url, binary=True))
+        with open_data(url, binary=True) as f:
+            bs4.BeautifulSoup.__init__(self, f,
+                                       parser or get_default_parser(),
+                                       parse_only=parse_only)
+        self.headings = None
 
-    def get_child_links(self):
-        '''Return a set of links that are descendants of this page.'''
-        links = set()
+    def get_headings(self, title):
+        '''Return the list of strings of this page that match the heading
+        title (see get_heading_pattern), in document order.'''
+        if self.headings is None:
+            # Index all strings of the page by their heading text at once
+            self.headings = collections.defaultdict(list)
+            for string in self.find_all(text=True):
+                self.headings[normalize_heading(string)].append(string)
+        return self.headings.get(normalize_heading(title), [])
+
+    def get_base(self):
+        '''Return the base URL of the links of this page.'''
+        base = self.find('base', href=True)
+        return urljoin(self.url, base['href']) if base else self.url
+
+    def get_rdfa_value(self, prop):
+        '''Return the literal value of the RDFa property prop (a full IRI) of
+        this page, or None.
+
+        Only properties whose subject is the page itself are found, that is
+        on tags without a different subject set by themselves or by their
+        ancestors (about, resource, typeof, or rel/rev links).
+        '''
+        base = self.get_base()
+        for tag in self.find_all(property=True):
+            if prop not in get_rdfa_iris(tag, tag['property']) or \
+               any(attr in tag.attrs for attr in RDFA_RESOURCE_ATTRS):
+                continue
+            if get_rdfa_subject(tag, base) == self.url:
+                if 'content' in tag.attrs:
+                    return tag['content']
+                return tag.get_text()
+        return None
+
+    def get_child_link_tags(self):
+        '''Yield the (url, tag) tuples of the links that are descendants of
+        this page.'''
         url = self.url
         if not url.endswith('/'):
             url += "/"
@@ -47,8 +115,36 @@ class HTMLPage(bs4.BeautifulSoup):
                child.netloc == parent.netloc and \
                child.path.startswith(parent.path) and \
                len(child.path) > len(parent.path):
-                links.add(url)
-        return links
+                yield url, a
+
+    def get_child_links(self):
+        '''Return a set of links that are descendants of this page.'''
+        return {url for url, a in self.get_child_link_tags()}
+
+    def get_directory_listing(self, tz=datetime.timezone.utc):
+        '''Return the list of (url, size, mtime) tuples of the files of this
+        page, a directory index as generated by Apache (either as a table or
+        preformatted text).
+
+        url is the URL of the file, size its size as displayed (e.g. "12K") and
+        mtime its modification time, converted to UTC. The size and time are
+        None if they are not displayed.
+
+        Arguments:
+        tz -- the time zone of the server, in which the times are displayed
+        '''
+        entries = collections.OrderedDict()
+        for url, a in self.get_child_link_tags():
+            size, mtime = None, None
+            m = LISTING_ENTRY.match(get_text_after(a))
+            if m:
+                mtime = parse_listing_date(m.group('date'), tz)
+                if m.group('size') not in {None, '-'}:
+                    size = m.group('size')
+            # Icons may link to the same file without the details
+            if url not in entries or mtime is not None:
+                entries[url] = (url, size, mtime)
+        return list(entries.values())
 
     def get_section_text(self, title, stop=[]):
         '''Return the text under heading title.
@@ -58,8 +154,7 @@ class HTMLPage(bs4.BeautifulSoup):
         stop -- a list of heading texts that indicate a following section
         '''
         if not isinstance(title, bs4.element.PageElement):
-            pattern = get_heading_pattern(title)
-            for tag in self.find_all(text=pattern):
+            for tag in self.get_headings(title):
                 result = self.get_section_text(tag, stop=stop)
                 if result:
                     return result
@@ -119,6 +214,160 @@ class HTMLPage(bs4.BeautifulSoup):
         return html_to_plain(tags)
 
 
+# Prefixes of the RDFa 1.1 initial context
+RDFA_PREFIXES = {
+    'dc': "http://purl.org/dc/terms/",
+    'dcterms': "http://purl.org/dc/terms/",
+    'dc11': "http://purl.org/dc/elements/1.1/",
+    'foaf': "http://xmlns.com/foaf/0.1/",
+    'owl': "http://www.w3.org/2002/07/owl#",
+    'rdf': "http://www.w3.org/1999/02/22-rdf-syntax-ns#",
+    'rdfs': "http://www.w3.org/2000/01/rdf-schema#",
+    'schema': "http://schema.org/",
+    'skos': "http://www.w3.org/2004/02/skos/core#",
+    'xsd': "http://www.w3.org/2001/XMLSchema#",
+}
+
+# Attributes giving a resource instead of a literal to a property
+RDFA_RESOURCE_ATTRS = ['resource', 'typeof', 'href', 'src']
+
+
+def get_rdfa_iris(tag, value):
+    '''Return the set of IRIs of the terms and CURIEs in the RDFa attribute
+    value of tag.'''
+    prefixes = dict(RDFA_PREFIXES)
+    vocab = None
+    # Declarations of the innermost tags come last and take precedence
+    for t in reversed([tag] + list(tag.parents)):
+        for name, iri in t.attrs.items():
+            if name.startswith('xmlns:'):
+                prefixes[name[6:]] = iri
+        if 'prefix' in t.attrs:
+            declaration = t['prefix'].split()
+            for name, iri in zip(declaration[::2], declaration[1::2]):
+                if name.endswith(':'):
+                    prefixes[name[:-1].lower()] = iri
+        if 'vocab' in t.attrs:
+            vocab = t['vocab'] or None
+    iris = set()
+    for term in value.split():
+        if ':' in term:
+            prefix, reference = term.split(':', 1)
+            if prefix.lower() in prefixes:
+                iris.add(prefixes[prefix.lower()] + reference)
+            elif prefix != '_':
+                iris.add(term)
+        elif vocab:
+            iris.add(vocab + term)
+    return iris
+
+
+def get_rdfa_subject(tag, base):
+    '''Return the IRI of the subject of the RDFa properties of tag, or None
+    if it is not set by an about attribute or the base.'''
+    if 'about' in tag.attrs:
+        return urljoin(base, tag['about'])
+    for parent in tag.parents:
+        if 'about' in parent.attrs:
+            return urljoin(base, parent['about'])
+        if 'resource' in parent.attrs or 'typeof' in parent.attrs or \
+           (('rel' in parent.attrs or 'rev' in parent.attrs) and \
+            ('href' in parent.attrs or 'src' in parent.attrs)):
+            return None
+    return base
+
+
+# Modification time and size following a file name in a directory index
+LISTING_ENTRY = re.compile(r"\s*(?P<date>\d{4}-\d\d-\d\d \d\d:\d\d(?::\d\d)?|"
+                           r"\d\d-[A-Z][a-z]{2}-\d{4} \d\d:\d\d(?::\d\d)?)"
+                           r"(?:\s+(?P<size>\d[\d.]*[KMGT]?|-))?")
+
+LISTING_DATE_FORMATS = ["%Y-%m-%d %H:%M", "%Y-%m-%d %H:%M:%S",
+                        "%d-%b-%Y %H:%M", "%d-%b-%Y %H:%M:%S"]
+
+
+def get_text_after(a):
+    '''Return the text following link a on the same table row or line.'''
+    td = a.find_parent('td')
+    if td is not None:
+        return " ".join(cell.get_text() for cell in td.find_next_siblings('td'))
+    text = a.next_sibling
+    if isinstance(text, str):
+        return text.split("\n", 1)[0]
+    return ""
+
+
+def parse_listing_date(text, tz=datetime.timezone.utc):
+    '''Return the datetime displayed as text in a directory index in time
+    zone tz, converted to UTC, or None.'''
+    for fmt in LISTING_DATE_FORMATS:
+        try:
+            date = datetime.datetime.strptime(text, fmt)
+        except ValueError:
+            continue
+        return date.replace(tzinfo=tz).astimezone(datetime.timezone.utc)
+    return None
+
+
+class EuropeanTimezone(datetime.tzinfo):
+
+    '''Time zone following the summer time rules of the European Union:
+    summer time lasts from 01:00 UTC on the last Sunday of March to 01:00 UTC
+    on the last Sunday of October. Local times repeated when summer time ends
+    are taken as standard time.
+
+    Arguments:
+    hours -- the offset of standard time from UTC, in hours
+    name -- the name of standard time
+    dst_name -- the name of summer time
+    '''
+
+    def __init__(self, hours, name, dst_name):
+        self.offset = datetime.timedelta(hours=hours)
+        self.name = name
+        self.dst_name = dst_name
+
+    @staticmethod
+    def last_sunday(year, month):
+        '''Return the date of the last Sunday of month, at midnight.'''
+        date = datetime.datetime(year, month, 28) + datetime.timedelta(4)
+        date = date.replace(day=1) - datetime.timedelta(1)
+        return date - datetime.timedelta((date.weekday() + 1) % 7)
+
+    def dst(self, dt):
+        if dt is None:
+            return datetime.timedelta(0)
+        # Transitions at 01:00 UTC, in local standard time
+        change = datetime.timedelta(hours=1) + self.offset
+        start = self.last_sunday(dt.year, 3) + change
+        end = self.last_sunday(dt.year, 10) + change
+        if start <= dt.replace(tzinfo=None) < end:
+            return datetime.timedelta(hours=1)
+        return datetime.timedelta(0)
+
+    def utcoffset(self, dt):
+        return self.offset + self.dst(dt)
+
+    def tzname(self, dt):
+        return self.dst_name if self.dst(dt) else self.name
+
+
+HEADING_PREFIX = re.compile(r"\d[\d.]*\s")
+
+
+def normalize_heading(text):
+    '''Return the text of a heading without section number, final colon and
+    surrounding spaces, in lower case.'''
+    text = text.strip()
+    prefix = HEADING_PREFIX.match(text)
+    if prefix:
+        text = text[prefix.end():].lstrip()
+    if text.endswith(":"):
+        text = text[:-1].rstrip()
+    return text.lower()
+
+
+@functools.lru_cache(maxsize=None)
 def get_heading_pattern(title):
     '''Return the regular expression for matching the text corresponding to
     title.'''
@@ -184,6 +433,12 @@ def gather_siblings(tag, stopclass=None, stoptext=None):
         tag = get_next_real_sibling(tag)
 
 
+SPACES = re.compile(r"\s+")
+LINE_SPACES = re.compile(r"[ \t\r\f\v]+")
+NEWLINES = re.compile(r"\n{2,}")
+LINE_EDGE_SPACES = re.compile(r"^ +| +$", flags=re.M)
+
+
 def clean_text(text, oneline=False):
     '''Clean text, removing spurious whitespaces.
 
@@ -193,37 +448,126 @@ def clean_text(text, oneline=False):
     '''
     text = text.strip().replace("\r\n", "\n")
     if oneline:
-        text = re.sub(r"\s+", r" ", text)
+        text = SPACES.sub(" ", text)
     else:
-        text = re.sub(r"[ \t\r\f\v]+", r" ", text)
-        text = re.sub(r"\n{2,}", r"\n\n", text)
-    text = re.sub(r"^ +| +$", r"", text, flags=re.M)
+        text = LINE_SPACES.sub(" ", text)
+        text = NEWLINES.sub("\n\n", text)
+    text = LINE_EDGE_SPACES.sub("", text)
     return text
 
 
+def clean_spaces(spaces, depth):
+    '''Return the whitespace spaces (made of spaces and newlines) between
+    two words as cleaned by clean_text, applied depth times.'''
+    if "\n" not in spaces:
+        return " "
+    elif depth > 1:
+        return "\n" if spaces.count("\n") == 1 else "\n\n"
+    else:
+        return "".join("\n" * min(len(newlines), 2)
+                       for newlines in spaces.split(" ") if newlines)
+
+
+class PlainTextWriter:
+
+    '''Writer of the plain text contained in HTML tags.
+
+    The text of each block (paragraph, list item...) is cleaned with
+    clean_text, then cleaned again as part of the text of its parent block.
+    Cleaning a block strips its leading and trailing whitespace, so the
+    whitespace remaining between two words is the one written directly in
+    the innermost block containing both words. The writer keeps track of
+    this whitespace and cleans it once, when the second word is written.
+
+    Attributes:
+    words -- the list of words and cleaned whitespace written so far
+    spaces -- the list of whitespace written in each open block since its
+              last word
+    depth -- the number of open blocks containing at least one word
+    '''
+
+    def __init__(self):
+        self.words = []
+        self.spaces = [[]]
+        self.depth = 0
+
+    def getvalue(self):
+        '''Return the plain text.'''
+        return "".join(self.words)
+
+    def write_word(self, word):
+        '''Write a word (text without leading or trailing whitespace).'''
+        if self.depth:
+            spaces = self.spaces[self.depth - 1]
+            if spaces:
+                self.words.append(clean_spaces("".join(spaces), self.depth))
+                del spaces[:]
+        self.depth = len(self.spaces)
+        self.words.append(word)
+
+    def write_space(self, space):
+        '''Write whitespace (spaces and newlines only).'''
+        # Leading whitespace of a block is dropped
+        if self.depth == len(self.spaces):
+            self.spaces[-1].append(space)
+
+    def write_string(self, string):
+        '''Write a string, where all whitespace counts as spaces.'''
+        words = string.split()
+        if not words:
+            if string:
+                self.write_space(" ")
+            return
+        if string[0].isspace():
+            self.write_space(" ")
+        # Spaces between words of the same string are always cleaned to one
+        self.write_word(" ".join(words))
+        if string[-1].isspace():
+            self.write_space(" ")
+
+    def write_block(self, tags):
+        '''Write tags as a separately cleaned block.'''
+        self.spaces.append([])
+        self.write_tags(tags)
+        # Trailing whitespace of a block is dropped
+        self.spaces.pop()
+        self.depth = min(self.depth, len(self.spaces))
+
+    def write_tags(self, tags):
+        '''Write the text contained in tags.'''
+        if isinstance(tags, str) or isinstance(tags, bs4.element.Tag):
+            tags = [tags]
+        for tag in tags:
+            if isinstance(tag, str):
+                self.write_string(tag)
+            elif tag.name in {'p', 'div'}:
+                self.write_space("\n\n")
+                self.write_block(tag.children)
+                self.write_space("\n\n")
+            elif tag.name == 'ul':
+                self.write_space("\n\n")
+                for li in tag.find_all('li', recursive=False):
+                    self.write_space("\n")
+                    self.write_word("*")
+                    self.write_space(" ")
+                    self.write_block(li.children)
+                self.write_space("\n\n")
+            elif tag.name == 'ol':
+                self.write_space("\n\n")
+                for i, li in enumerate(tag.find_all('li', recursive=False)):
+                    self.write_space("\n")
+                    self.write_word(str(i) + ".")
+                    self.write_space(" ")
+                    self.write_block(li.children)
+                self.write_space("\n\n")
+            elif tag.name == 'br':
+                self.write_space("\n")
+            else:
+                self.write_string(tag.text)
+
+
 def html_to_plain(tags):
     '''Return the text contained in tags.'''
-    if isinstance(tags, str) or isinstance(tags, bs4.element.Tag):
-        tags = [tags]
-    result = ""
-    for tag in tags:
-        if isinstance(tag, str):
-            result += re.sub(r"\s", " ", tag)
-        elif tag.name in {'p', 'div'}:
-            result += "\n\n" + html_to_plain(tag.children) + "\n\n"
-        elif tag.name == 'ul':
-            result += "\n\n"
-            for li in tag.find_all('li', recursive=False):
-                result += "\n* " + html_to_plain(li.children)
-            result += "\n\n"
-        elif tag.name == 'ol':
-            result += "\n\n"
-            for i, li in enumerate(tag.find_all('li', recursive=False)):
-                result += "\n" + str(i) + ". " + \
-                          html_to_plain(li.children)
-            result += "\n\n"
-        elif tag.name == 'br':
-            result += "\n"
-        else:
-            result += re.sub(r"\s", " ", tag.text)
-    return clean_text(result)
+    writer = PlainTextWriter()
+    writer.write_tags(tags)
+    return writer.getvalue()
@@ -46,6 +46,8 @@ Language = rdflib.Namespace("http://id.loc.gov/vocabulary/iso639-1/")
 @adms_resource(DCTERMS.Agent, also=FOAF.Agent)
 class Publisher(ADMSResource):
 
+    __slots__ = ()
+
     # Recommended properties
     name            = ADMSProperty(RDFS.label, also=FOAF.name, rng=ADMSProperty.UNIQUETEXT)
     type            = ADMSProperty(DCTERMS.type, rng=PublisherType)
@@ -57,6 +59,8 @@ class Publisher(ADMSResource):
 @adms_resource(DCTERMS.LicenseDocument)
 class LicenseDocument(ADMSResource):
 
+    __slots__ = ()
+
     # Mandatory properties
     type            = ADMSProperty(DCTERMS.type, rng=LicenceType, min=1, max=1)
     # Recommended properties
@@ -75,6 +79,8 @@ UNKNOWN_LICENSE.label = Literal("Unknown Licence", lang="en")
 @adms_resource(ADMS.SemanticAssetDistribution, also=ADMS.AssetDistribution)
 class AssetDistribution(ADMSResource):
 
+    __slots__ = ()
+
     # Mandatory properties
     accessURL       = ADMSProperty(ADMS.accessURL, also=DCAT.accessURL, rng=ADMSProperty.ACCESSURL, min=1)
     status          = ADMSProperty(ADMS.status, rng=Status, min=1, max=1)
@@ -101,6 +107,8 @@ class AssetDistribution(ADMSResource):
 @adms_resource(ADMS.SemanticAsset, also=ADMS.Asset)
 class Asset(ADMSResource):
 
+    __slots__ = ()
+
     # Mandatory properties
     theme           = ADMSProperty(DCTERMS.subject, also=DCAT.theme, rng=Eurovoc, min=1)
     description     = ADMSProperty(DCTERMS.description, rng=ADMSProperty.UNIQUETEXT, min=1)
@@ -161,6 +169,8 @@ Asset.translation.rng = Asset
 @adms_resource(ADMS.SemanticAssetRepository, also=ADMS.AssetRepository)
 class Repository(ADMSResource):
 
+    __slots__ = ()
+
     # Mandatory properties
     accessURL       = ADMSProperty(ADMS.accessURL, also=DCAT.accessURL, rng=ADMSProperty.ACCESSURL, min=1)
     title           = ADMSProperty(RDFS.label, also=DCTERMS.title, rng=ADMSProperty.UNIQUETEXT, min=1)
@@ -179,26 +189,40 @@ class Repository(ADMSResource):
     def __init__(self, uri):
         ADMSResource.__init__(self, uri)
 
+    def get_translatable(self):
+        '''Generate the (resource, property) pairs that should have an
+        english text.'''
+        yield self, 'title'
+        yield self, 'description'
+        for asset in self.view_values('dataset'):
+            yield asset, 'title'
+            yield asset, 'description'
+            yield asset, 'altLabel'
+            for d in asset.view_values('distribution'):
+                yield d, 'title'
+                yield d, 'description'
+
     def cleanup(self):
         '''Perform common cleanup and auto-complete tasks.'''
-        self.ensure_english('title')
-        self.ensure_english('description')
+        # Translate all texts at once before completing the resources
+        translatable = list(self.get_translatable())
+        translations = translate_all(text for text in
+                                     (resource.get_untranslated(prop)
+                                      for resource, prop in translatable)
+                                     if text is not None)
+        for resource, prop in translatable:
+            resource.ensure_english(prop, translations)
         self.accessURL = self.accessURL or self.uri
         if not self.modified:
             now = datetime.datetime.now(datetime.timezone.utc)
             self.modified = datetime.datetime(now.year, now.month, now.day,
                                               now.hour, now.minute, now.second,
                                               tzinfo=now.tzinfo)
-        for asset in self.get_values('dataset'):
-            asset.ensure_english('title')
-            asset.ensure_english('description')
-            asset.ensure_english('altLabel')
+        for asset in self.view_values('dataset'):
             asset.publisher = asset.publisher or self.publisher
             asset.modified = asset.modified or asset.issued or self.modified
             asset.issued = asset.issued or asset.modified
-            for d in asset.get_values('distribution'):
-                d.ensure_english('title')
-                d.ensure_english('description')
+            for d in asset.view_values('distribution'):
                 d.title = d.title or asset.title
                 d.accessURL = d.accessURL or d.uri
                 d.status = d.status or asset.status
@@ -21,9 +21,26 @@ import os
 import os.path
 import logging
 import importlib
+import collections
+import hashlib
+import json
+import tempfile
+import functools
+import concurrent.futures
 
+from . import files
 from .files import *
 from .model import *
+from .translation import flush_translations
+
+LOG_FORMAT = "[%(asctime)s] %(levelname)s %(message)s"
+
+# Extensions of the output files, indexed by serialization format
+EXTENSIONS = {'xml': '.rdf', 'turtle': '.ttl', 'nt': '.nt'}
+
+ProcessSummary = collections.namedtuple('ProcessSummary',
+        ['assets', 'distributions', 'licenses', 'publishers'])
+
 
 class Processor:
 
@@ -36,9 +53,98 @@ class Processor:
     def __init__(self, name):
         self.name = name
 
-    def process(self, strict=False):
+    def get_state_filename(self):
+        '''Return the name of the file recording the inputs of the last run.'''
+        return os.path.join(OUT_DIR, self.name + '.state')
+
+    def get_output_filename(self, format):
+        '''Return the name of the output file in format.'''
+        return os.path.join(OUT_DIR, self.name + EXTENSIONS[format])
+
+    def get_fingerprint(self, urls, strict, format):
+        '''Return a fingerprint of the inputs of a run: the source code, the
+        data files, the cached versions of urls, and the options.'''
+        digest = hashlib.sha1(repr((strict, format)).encode())
+        sources = os.path.dirname(__file__)
+        filenames = [os.path.join(sources, 'repos', self.name + '.py')]
+        filenames.extend(os.path.join(sources, filename)
+                         for filename in sorted(os.listdir(sources))
+                         if filename.endswith('.py'))
+        data_dir = os.path.join(DATA_DIR, self.name)
+        if os.path.isdir(data_dir):
+            for dirpath, dirnames, names in sorted(os.walk(data_dir)):
+                dirnames.sort()
+                filenames.extend(os.path.join(dirpath, name)
+                                 for name in sorted(names))
+        for filename in filenames:
+            digest.update(filename.encode())
+            with open(filename, 'rb') as f:
+                digest.update(f.read())
+        for url in urls:
+            digest.update(get_url_fingerprint(url).encode())
+        return digest.hexdigest()
+
+    def is_up_to_date(self, strict, format):
+        '''Return the ProcessSummary of the last run if its inputs did not
+        change and its output still exists, None otherwise.'''
+        try:
+            with open(self.get_state_filename(), 'r') as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if not os.path.exists(self.get_output_filename(format)):
+            return None
+        try:
+            fingerprint = self.get_fingerprint(state['urls'], strict, format)
+        except Exception as e:
+            logging.debug("Unable to compute fingerprint: %s.", e)
+            return None
+        if fingerprint != state['fingerprint']:
+            return None
+        return ProcessSummary(*state['summary'])
+
+    def save_state(self, strict, format, summary):
+        '''Record the inputs of the current run.'''
+        urls = get_recorded_urls()
+        state = {'fingerprint': self.get_fingerprint(urls, strict, format),
+                 'urls': urls,
+                 'summary': list(summary)}
+        with open(self.get_state_filename(), 'w') as f:
+            json.dump(state, f, indent=1)
+
+    def invalidate_state(self):
+        '''Forget the inputs of the last run, so that the next run processes
+        the repository even if the output is left incomplete.'''
+        try:
+            os.remove(self.get_state_filename())
+        except FileNotFoundError:
+            pass
+
+    def process(self, strict=False, force=False, format='xml'):
+        '''Process the repository and write the result to the output
+        directory. Return a ProcessSummary, or None if processing failed.
+
+        Arguments:
+        strict -- if True, do not cleanup and autocomplete the model
+        force -- if False, do nothing if the inputs did not change since the
+                 last run
+        format -- the serialization format (see EXTENSIONS)
+        '''
+        if not force:
+            with module_context(self.name):
+                summary = self.is_up_to_date(strict, format)
+            if summary:
+                logging.info("Repository %s is up to date.", self.name)
+                return summary
+        try:
+            return self._process(strict, format)
+        finally:
+            flush_translations()
+
+    def _process(self, strict, format):
         logging.info("Processing repository %s.", self.name)
         with module_context(self.name):
+            start_recording()
             module = importlib.import_module('..repos.' + self.name, __name__)
             try:
                 repo = module.process()
@@ -46,14 +152,14 @@ class Processor:
                 logging.exception("Unable to process repository.")
                 return
             logging.debug("Removing non top-level assets.")
-            assets = repo.get_values('dataset')
+            assets = repo.view_values('dataset')
             for asset in assets:
                 for prop in ['related', 'included', 'last', 'next', 'prev',
                              'sample', 'translation']:
                     values = {value.uri if isinstance(value, Asset) and
                                            value not in assets
                                         else value
-                              for value in asset.get_values(prop)}
+                              for value in asset.view_values(prop)}
                     setattr(asset, prop, values)
             if not strict:
                 logging.debug("Cleaning and autocompleting repository.")
@@ -63,28 +169,159 @@ class Processor:
                 logging.error("Result is not a Repository: %s.", repo)
                 return
             repo.validate().log()
-            logging.debug("Constructing graph")
-            g = Graph(repo)
-            filename = os.path.join(OUT_DIR, self.name + '.rdf')
+            filename = self.get_output_filename(format)
             logging.debug("Serializing result to %s.", filename)
             try:
                 os.makedirs(OUT_DIR, exist_ok=True)
-                with open(filename, 'wb') as f:
-                    g.serialize(f)
+                self.invalidate_state()
+                # Stream to a temporary file first so that a failure does not
+                # destroy the previous output
+                fd, tmpname = tempfile.mkstemp(dir=OUT_DIR)
+                try:
+                    with os.fdopen(fd, 'wb') as f:
+                        serialize(repo, f, format)
+                    # Temporary files are private: use the default mode
+                    umask = os.umask(0)
+                    os.umask(umask)
+                    os.chmod(tmpname, 0o666 & ~umask)
+                    os.replace(tmpname, filename)
+                except:
+                    os.remove(tmpname)
+                    raise
             except:
                 logging.exception("Unable to serialize graph.")
                 return
-        assets = repo.get_values('dataset')
-        distributions = set.union(*(a.get_values('distribution') for a in assets))
-        licenses = set.union(*(d.get_values('license') for d in distributions))
-        publishers = set.union(*(a.get_values('publisher') for a in assets)) | \
-                     set.union(*(d.get_values('publisher') for d in distributions)) | \
-                     repo.get_values('publisher')
+        assets = repo.view_values('dataset')
+        distributions = set().union(*(a.view_values('distribution') for a in assets))
+        licenses = set().union(*(d.view_values('license') for d in distributions))
+        publishers = set().union(*(a.view_values('publisher') for a in assets)) | \
+                     set().union(*(d.view_values('publisher') for d in distributions)) | \
+                     set(repo.view_values('publisher'))
         logging.info("Successfully processed %d assets, %d distributions, " +
                      "%d licenses, and %d publishers.",
                      len(assets), len(distributions), len(licenses),
                      len(publishers))
         CURRENT_MODULE = ""
+        summary = ProcessSummary(len(assets), len(distributions), len(licenses),
+                                 len(publishers))
+        with module_context(self.name):
+            try:
+                self.save_state(strict, format, summary)
+            except:
+                logging.exception("Unable to save the state of the run.")
+        return summary
+
+
+class LogPrefix(logging.Filter):
+
+    '''Logging filter prefixing all messages with a fixed text.'''
+
+    def __init__(self, prefix):
+        logging.Filter.__init__(self)
+        self.prefix = prefix
+
+    def filter(self, record):
+        record.msg = self.prefix + str(record.msg)
+        return True
+
+
+def _process_worker(name, strict, force, format, level, ttl):
+    '''Process repository name in a worker process.'''
+    logging.basicConfig(level=level, format=LOG_FORMAT)
+    # Worker processes are reused: replace the prefix of the previous run
+    for handler in logging.getLogger().handlers:
+        for f in handler.filters[:]:
+            if isinstance(f, LogPrefix):
+                handler.removeFilter(f)
+        handler.addFilter(LogPrefix(name + ": "))
+    set_cache_ttl(ttl)
+    return processors[name].process(strict=strict, force=force,
+                                    format=format)
+
+
+def process_all(names=None, strict=False, force=False, format='xml',
+                max_workers=None):
+    '''Process repositories concurrently, each one in its own process.
+
+    Arguments:
+    names -- the names of the repositories (default: all known ones)
+    strict -- if True, do not cleanup and autocomplete the models
+    force -- if True, process repositories even if their inputs did not change
+    format -- the serialization format (see EXTENSIONS)
+    max_workers -- the maximum number of processes (default: one per CPU)
+
+    Return a dictionary mapping each name to its ProcessSummary, or to None
+    if processing failed.
+    '''
+    if names is None:
+        names = sorted(processors.keys())
+    level = logging.getLogger().getEffectiveLevel()
+    results = {}
+    with concurrent.futures.ProcessPoolExecutor(max_workers) as executor:
+        futures = {executor.submit(_process_worker, name, strict, force,
+                                   format, level, files.CACHE_TTL):name
+                   for name in names}
+        for future in concurrent.futures.as_completed(futures):
+            name = futures[future]
+            try:
+                results[name] = future.result()
+            except Exception:
+                logging.exception("Worker for repository %s failed.", name)
+                results[name] = None
+    summaries = [summary for summary in results.values() if summary]
+    failures = sorted(name for name, summary in results.items()
+                      if summary is None)
+    logging.info("Processed %d repositories: %d assets, %d distributions, " +
+                 "%d failures%s.",
+                 len(summaries), sum(s.assets for s in summaries),
+                 sum(s.distributions for s in summaries), len(failures),
+                 " (" + ", ".join(failures) + ")" if failures else "")
+    return results
+
+
+def _map_worker_init(module, level, ttl):
+    '''Initialize a worker process of map_processes.'''
+    logging.basicConfig(level=level, format=LOG_FORMAT)
+    set_current_module(module)
+    set_cache_ttl(ttl)
+
+
+def _map_worker(func, item):
+    '''Return func(item) and the URLs it opened.'''
+    start_recording()
+    try:
+        return func(item), get_recorded_urls()
+    finally:
+        # Worker processes do not run exit handlers
+        flush_translations()
+
+
+def map_processes(func, items, max_workers=None):
+    '''Return the list of func(item) for each item of items, computed in
+    worker processes for CPU-bound tasks such as parsing pages.
+
+    The workers use the current module and cache settings, and the URLs they
+    open are recorded as inputs of the current run (see start_recording).
+
+    Arguments:
+    func -- a module-level function, taking and returning picklable values
+    items -- the arguments of func
+    max_workers -- the maximum number of processes (default: one per CPU)
+    '''
+    items = list(items)
+    if not items:
+        return []
+    results = []
+    initargs = (getattr(files, 'CURRENT_MODULE', None),
+                logging.getLogger().getEffectiveLevel(), files.CACHE_TTL)
+    with concurrent.futures.ProcessPoolExecutor(max_workers,
+            initializer=_map_worker_init, initargs=initargs) as executor:
+        for result, urls in executor.map(functools.partial(_map_worker, func),
+                                         items):
+            for url in urls:
+                record_url(url)
+            results.append(result)
+    return results
 
 
 processors = {}
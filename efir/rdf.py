@@ -21,10 +21,15 @@
 import logging
 import rdflib
 import datetime
+import re
+import io
+import functools
+import time
+import xml.sax.saxutils
 from .files import *
 from .translation import *
 
-from rdflib import URIRef, Literal
+from rdflib import URIRef, Literal, BNode
 from rdflib.namespace import RDF, RDFS, XSD, OWL, SKOS, DCTERMS, FOAF
 
 ADMS = rdflib.Namespace("http://www.w3.org/ns/adms#")
@@ -36,6 +41,44 @@ SCHEMA = rdflib.Namespace("http://schema.org/")
 SPDX = rdflib.Namespace("http://spdx.org/rdf/terms#")
 XHV = rdflib.Namespace("http://www.w3.org/1999/xhtml/vocab#")
 
+# Prefixes bound in graphs and serializations.
+NAMESPACES = [('rdf', RDF), ('rdfs', RDFS), ('xsd', XSD), ('owl', OWL),
+              ('skos', SKOS), ('dcterms', DCTERMS), ('foaf', FOAF),
+              ('adms', ADMS), ('admssw', ADMSSW), ('radion', RADION),
+              ('dcat', DCAT), ('wrds', WRDS), ('schema', SCHEMA),
+              ('spdx', SPDX), ('xhv', XHV)]
+
+# Cache of prepared SPARQL queries and updates, indexed by kind, query text
+# and namespace bindings.
+PREPARED_QUERIES = {}
+
+def prepare_sparql(text, namespaces, update=False):
+    '''Parse and translate a SPARQL query (or update if update is true),
+    declaring the given (prefix, uri) namespaces. The algebra is cached so
+    that each query is only compiled once per run.'''
+    namespaces = tuple(sorted((name, str(uri)) for name, uri in namespaces))
+    key = (update, text, namespaces)
+    prepared = PREPARED_QUERIES.get(key)
+    if prepared is None:
+        from rdflib.plugins.sparql.parser import parseUpdate
+        from rdflib.plugins.sparql.algebra import translateUpdate
+        from rdflib.plugins.sparql.processor import prepareQuery
+        if update:
+            preamble = "".join("PREFIX " + name + ": <" + uri + ">\n"
+                               for name, uri in namespaces)
+            prepared = translateUpdate(parseUpdate(preamble + text))
+        else:
+            prepared = prepareQuery(text, initNs=dict(namespaces))
+        PREPARED_QUERIES[key] = prepared
+    return prepared
+
+def get_query_summary(text, length=100):
+    '''Return a SPARQL query on a single line, shortened for logging.'''
+    text = " ".join(line.strip() for line in text.splitlines()
+                    if not line.strip().upper().startswith("PREFIX"))
+    text = " ".join(text.split())
+    return text if len(text) <= length else text[:length - 3] + "..."
+
 # Global dictionary of registered ADMSResources, indexed by type uri.
 ADMS_RESOURCES = {}
 
@@ -46,21 +89,8 @@ class Graph(rdflib.Graph):
 
     def __init__(self, data=None):
         rdflib.Graph.__init__(self)
-        self.bind('rdf', str(RDF))
-        self.bind('rdfs', str(RDFS))
-        self.bind('xsd', str(XSD))
-        self.bind('owl', str(OWL))
-        self.bind('skos', str(SKOS))
-        self.bind('dcterms', str(DCTERMS))
-        self.bind('foaf', str(FOAF))
-        self.bind('adms', str(ADMS))
-        self.bind('admssw', str(ADMSSW))
-        self.bind('radion', str(RADION))
-        self.bind('dcat', str(DCAT))
-        self.bind('wrds', str(WRDS))
-        self.bind('schema', str(SCHEMA))
-        self.bind('spdx', str(SPDX))
-        self.bind('xhv', str(XHV))
+        for prefix, namespace in NAMESPACES:
+            self.bind(prefix, str(namespace))
         if data is not None:
             self.add(data)
 
@@ -85,8 +115,15 @@ class Graph(rdflib.Graph):
         else:
             super().add(item)
 
-    def query(self, *args, **kwargs):
-        result = super().query(*args, **kwargs)
+    def query(self, query, **kwargs):
+        if not isinstance(query, str):
+            result = super().query(query, **kwargs)
+        else:
+            prepared = prepare_sparql(query, self.namespaces())
+            start = time.perf_counter()
+            result = super().query(prepared, **kwargs)
+            logging.debug("Query took %.3fs: %s", time.perf_counter() - start,
+                          get_query_summary(query))
         if result.graph is not None:
             g = Graph()
             g += result.graph
@@ -94,22 +131,76 @@ class Graph(rdflib.Graph):
         return result
 
     def update(self, query):
-        query = "".join("PREFIX " + name + ": <" + str(uri) + ">\n"
-                        for name, uri in self.namespaces()) + query
-        super().update(query)
+        prepared = prepare_sparql(query, self.namespaces(), update=True)
+        start = time.perf_counter()
+        super().update(prepared)
+        logging.debug("Update took %.3fs: %s", time.perf_counter() - start,
+                      get_query_summary(query))
 
-    def extract(self, uri, known={}):
+    def extract(self, uri, known=None):
         '''Extract resource uri from the graph.
         The extraction is recursive. Known (i.e., already extracted) objects
         are fetched from and put into the known dictionary.
         Uri may also be a literal, in which case it is returned as is.
         '''
+        return Extractor(self, known).extract(uri)
+
+    def extract_all(self, cls):
+        '''Extract all resources of type cls (must be a subclass of
+        ADMSResource). The extraction is recursive.'''
+        assert issubclass(cls, ADMSResource)
+        extractor = Extractor(self)
+        result = []
+        for type_uri in cls.PARSE_URIS:
+            for uri in extractor.typed.get(type_uri, []):
+                result.append(extractor.extract(uri))
+        return result
+
+
+class Extractor:
+
+    '''Extract ADMSResources from a graph.
+
+    The graph is scanned once into indexes restricted to the properties of
+    the registered resource classes. Resources are then created and filled
+    from these indexes iteratively.
+
+    Attributes:
+    known -- a dictionary of extracted resources indexed by URI
+    objects -- a subject -> predicate -> objects index
+    subjects -- an object -> predicate -> subjects index (inverse properties)
+    typed -- a type -> subjects index
+    '''
+
+    def __init__(self, graph, known=None):
+        self.known = {} if known is None else known
+        self.objects = {}
+        self.subjects = {}
+        self.typed = {}
+        self.pending = []
+        predicates = set()
+        inverse = set()
+        for cls in set(ADMS_RESOURCES.values()):
+            for name, prop in cls.properties():
+                predicates.update(prop.parse_uris)
+                inverse.update(prop.parse_inv)
+        for s, p, o in graph:
+            if p == RDF.type:
+                self.typed.setdefault(o, []).append(s)
+            if p in predicates or p == RDF.type:
+                self.objects.setdefault(s, {}).setdefault(p, []).append(o)
+            if p in inverse:
+                self.subjects.setdefault(o, {}).setdefault(p, []).append(s)
+
+    def get(self, uri):
+        '''Return the resource uri, or uri itself if it is a literal or has
+        no known type. A new resource is only filled by run().'''
         if isinstance(uri, Literal):
             return uri
-        if uri in known:
-            return known[uri]
+        if uri in self.known:
+            return self.known[uri]
         cls = None
-        for type_uri in self.objects(uri, RDF.type):
+        for type_uri in self.objects.get(uri, {}).get(RDF.type, []):
             if type_uri in ADMS_RESOURCES:
                 newcls = ADMS_RESOURCES[type_uri]
                 if cls is not None and newcls != cls:
@@ -120,41 +211,49 @@ class Graph(rdflib.Graph):
         if cls is None:
             return uri
         resource = cls(uri)
-        known[uri] = resource
-        for name, prop in resource.properties():
-            values = set()
-            for prop_uri in prop.parse_uris:
-                values.update(self.extract(obj, known)
-                              for obj in self.objects(uri, prop_uri))
-            for prop_uri in prop.parse_inv:
-                values.update(self.extract(subj, known)
-                              for subj in self.subjects(prop_uri, uri))
-            if len(values) == 0:
-                continue
-            if len(values) == 1:
-                values = values.pop()
-            setattr(resource, name, values)
+        self.known[uri] = resource
+        self.pending.append(resource)
         return resource
 
-    def extract_all(self, cls):
-        '''Extract all resources of type cls (must be a subclass of
-        ADMSResource). The extraction is recursive.'''
-        assert issubclass(cls, ADMSResource)
-        known = {}
-        result = []
-        for type_uri in cls.PARSE_URIS:
-            for uri in list(self.subjects(RDF.type, type_uri)):
-                result.append(self.extract(uri, known))
-        return result
+    def run(self):
+        '''Fill the properties of all new resources.'''
+        while self.pending:
+            resource = self.pending.pop()
+            objects = self.objects.get(resource.uri, {})
+            subjects = self.subjects.get(resource.uri, {})
+            for name, prop in resource.properties():
+                values = set()
+                for prop_uri in prop.parse_uris:
+                    values.update(self.get(obj)
+                                  for obj in objects.get(prop_uri, []))
+                for prop_uri in prop.parse_inv:
+                    values.update(self.get(subj)
+                                  for subj in subjects.get(prop_uri, []))
+                if len(values) == 0:
+                    continue
+                if len(values) == 1:
+                    values = values.pop()
+                setattr(resource, name, values)
+
+    def extract(self, uri):
+        '''Extract resource uri and all resources it depends on.'''
+        resource = self.get(uri)
+        self.run()
+        return resource
 
 
 class ADMSProperty:
 
     '''Property of a domain model class.
 
+    Properties are descriptors storing their values in the slot index of
+    the ADMSResource instances.
+
     Attributes:
     name -- the name of the property (set by @adms_resource)
     resource_cls -- the containing resource class (set by @adms_resource)
+    index -- the index of the property in the class schema (set by
+             @adms_resource)
     uris -- the set of URIRef of the property
     parse_uris -- the set of recognized URIRef of the property
     inv -- the set of URIRef of the inverse property
@@ -203,6 +302,14 @@ class ADMSProperty:
         self.min = min
         self.max = max
 
+    def __get__(self, resource, cls):
+        if resource is None:
+            return self
+        return resource._values[self.index]
+
+    def __set__(self, resource, value):
+        resource._values[self.index] = value
+
     def __str__(self):
         return self.resource_cls.__name__ + '.' + self.name
 
@@ -217,6 +324,15 @@ class ADMSProperty:
             return False
         return self.resource_cls == obj.resource_cls and self.name == obj.name
 
+    @property
+    def rng(self):
+        return self._rng
+
+    @rng.setter
+    def rng(self, rng):
+        self._rng = rng
+        self._plan = None
+
     def _to_rdf(self, value):
         '''Return the RDF value of value.'''
         if isinstance(value, rdflib.term.Identifier):
@@ -226,6 +342,52 @@ class ADMSProperty:
         else:
             return Literal(value)
 
+    def _compile(self):
+        '''Compute and return the validation plan of this property: a
+        (range checker, check languages, check links) tuple. The range checker
+        is a function taking a value and its RDF value, or None if any value is
+        accepted.'''
+        if self.rng is None:
+            checker = None
+        else:
+            ranges = self.rng
+            if not isinstance(ranges, tuple):
+                ranges = (ranges,)
+            checkers = []
+            namespaces = tuple(str(rng) for rng in ranges
+                               if isinstance(rng, rdflib.Namespace))
+            if namespaces:
+                checkers.append(lambda value, obj: isinstance(obj, URIRef) and
+                                                   obj.startswith(namespaces))
+            for rng in ranges:
+                if isinstance(rng, rdflib.Namespace):
+                    pass
+                elif rng in (ADMSProperty.TEXT, ADMSProperty.UNIQUETEXT):
+                    checkers.append(check_text)
+                elif rng == ADMSProperty.ACCESSURL:
+                    checkers.append(check_uri)
+                elif issubclass(rng, rdflib.term.Identifier):
+                    checkers.append(lambda value, obj, rng=rng:
+                                    isinstance(obj, rng))
+                elif issubclass(rng, ADMSResource):
+                    checkers.append(lambda value, obj, rng=rng:
+                                    isinstance(value, rng) or
+                                    isinstance(obj, URIRef))
+                elif rng == datetime.datetime:
+                    checkers.append(check_datetime)
+                else:
+                    checkers.append(lambda value, obj, rng=rng:
+                                    isinstance(obj, Literal) and
+                                    isinstance(obj.toPython(), rng))
+            if len(checkers) == 1:
+                checker = checkers[0]
+            else:
+                checker = lambda value, obj: any(check(value, obj)
+                                                 for check in checkers)
+        self._plan = (checker, self.rng == ADMSProperty.UNIQUETEXT,
+                      self.rng == ADMSProperty.ACCESSURL)
+        return self._plan
+
     def validate(self, resource, deep=True, result=None):
         '''Validate this property.
 
@@ -237,7 +399,8 @@ class ADMSProperty:
         assert isinstance(resource, self.resource_cls)
         if result is None:
             result = ValidationResult()
-        values = resource.get_values(self)
+        checker, uniquetext, accessurl = self._plan or self._compile()
+        values = resource.view_values(self)
         # Check cardinality
         if len(values) < self.min:
             result.add(self, "Missing values", resource, len(values), self.min)
@@ -245,44 +408,24 @@ class ADMSProperty:
             result.add(self, "Too many values", resource, len(values), self.max)
         # Check individual values
         for value in values:
-            # Recursive check
-            if deep and isinstance(value, ADMSResource):
-                value.validate(deep=deep, result=result)
+            if isinstance(value, rdflib.term.Identifier):
+                obj = value
+            elif isinstance(value, ADMSResource):
+                obj = value.uri
+                # Recursive check
+                if deep:
+                    value.validate(deep=deep, result=result)
+            else:
+                obj = Literal(value)
             # Range check
-            if self.rng is not None:
-                ranges = self.rng
-                if not isinstance(ranges, tuple):
-                    ranges = (ranges,)
-                obj = self._to_rdf(value)
-                for rng in ranges:
-                    if rng in (ADMSProperty.TEXT, ADMSProperty.UNIQUETEXT):
-                        if isinstance(obj, Literal) and obj.language is not None:
-                            break
-                    elif rng == ADMSProperty.ACCESSURL:
-                        if isinstance(obj, URIRef):
-                            break
-                    elif isinstance(rng, rdflib.Namespace):
-                        if isinstance(obj, URIRef) and obj.startswith(rng):
-                            break
-                    elif issubclass(rng, rdflib.term.Identifier):
-                        if isinstance(obj, rng):
-                            break
-                    elif issubclass(rng, ADMSResource):
-                        if isinstance(value, rng) or isinstance(obj, URIRef):
-                            break
-                    elif isinstance(obj, Literal):
-                        if isinstance(obj.toPython(), rng):
-                            if rng != datetime.datetime or obj.toPython().tzinfo:
-                                break
-                else:
-                    result.add(self, "Wrong type", resource,
-                               obj.n3(), self.rng)
+            if checker is not None and not checker(value, obj):
+                result.add(self, "Wrong type", resource, obj.n3(), self.rng)
             # Inverse property check
             if self.inv and isinstance(obj, Literal):
                 result.add(self, "Literal subject in inverse property",
                            resource, obj.n3(), "resource")
         # Check for unique language tags
-        if self.rng == ADMSProperty.UNIQUETEXT:
+        if uniquetext:
             languages = set()
             reported = False
             for value in values:
@@ -296,14 +439,18 @@ class ADMSProperty:
                 result.add(self, "Missing English translation", resource,
                            "/".join(languages))
         # Check dead links
-        if self.rng == ADMSProperty.ACCESSURL:
+        if accessurl:
             for value in values:
-                if isinstance(value, URIRef) and not is_alive(str(value)):
-                    result.add(self, "Dead link", resource, value)
+                if isinstance(value, URIRef):
+                    alive = result.alive.get(str(value))
+                    if alive is None:
+                        alive = is_alive(str(value))
+                    if not alive:
+                        result.add(self, "Dead link", resource, value)
         return result
 
     def _add_to_graph(self, resource, g, memo):
-        for value in resource.get_values(self):
+        for value in resource.view_values(self):
             if isinstance(value, ADMSResource):
                 value._add_to_graph(g, memo)
             obj = self._to_rdf(value)
@@ -313,20 +460,47 @@ class ADMSProperty:
                 g.add((obj, uri, resource.uri))
 
 
+def check_text(value, obj):
+    '''Range checker for ADMSProperty.TEXT and ADMSProperty.UNIQUETEXT.'''
+    return isinstance(obj, Literal) and obj.language is not None
+
+def check_uri(value, obj):
+    '''Range checker for ADMSProperty.ACCESSURL.'''
+    return isinstance(obj, URIRef)
+
+def check_datetime(value, obj):
+    '''Range checker for datetime.datetime (with a timezone).'''
+    if not isinstance(obj, Literal):
+        return False
+    value = obj.toPython()
+    return isinstance(value, datetime.datetime) and value.tzinfo is not None
+
+
 class ADMSResource:
 
     '''Super-class for domain model classes.
     All subclasses shall have the @adms_resource(uri) decorator.
 
     Values for properties may be None, a single value, or a set of values.
+    They are stored in a list following the order of PROPERTIES. Subclasses
+    shall declare empty __slots__.
     '''
 
+    __slots__ = ('uri', '_values')
+
+    # Tuple of (name, property) tuples of the class (set by @adms_resource)
+    PROPERTIES = ()
+
     def __init__(self, uri):
         assert isinstance(uri, URIRef)
         self.uri = uri
-        for name, prop in self.__class__.__dict__.items():
-            if isinstance(prop, ADMSProperty):
-                setattr(self, name, None)
+        self._values = [None] * len(self.PROPERTIES)
+
+    def __reduce__(self):
+        return (self.__class__, (self.uri,), self._values)
+
+    def __setstate__(self, values):
+        self._values = values
 
     def __repr__(self):
         return '<' + self.__class__.__name__ + ' ' + str(self.uri) + '>'
@@ -341,10 +515,8 @@ class ADMSResource:
 
     @classmethod
     def properties(cls):
-        '''Yield all (name, properties) tuples of this resource.'''
-        for name, prop in cls.__dict__.items():
-            if isinstance(prop, ADMSProperty):
-                yield (name, prop)
+        '''Return the tuple of all (name, property) tuples of this resource.'''
+        return cls.PROPERTIES
 
     def get_values(self, prop):
         '''Return the set of values for property prop (a string or ADMSProperty
@@ -360,17 +532,51 @@ class ADMSResource:
             values = values.copy()
         return values
 
-    def ensure_english(self, prop):
+    def view_values(self, prop):
+        '''Return the values for property prop (a string or ADMSProperty
+        instance) without copying them: the stored set, or a tuple. The result
+        shall not be modified; use get_values to get a modifiable copy.'''
+        if isinstance(prop, ADMSProperty):
+            prop = prop.name
+        values = getattr(self, prop)
+        if values is None:
+            return ()
+        elif isinstance(values, set):
+            return values
+        else:
+            return (values,)
+
+    def get_untranslated(self, prop):
+        '''Return the text of property prop (a string or ADMSProperty
+        instance) that ensure_english would translate, or None.'''
+        if isinstance(prop, ADMSProperty):
+            prop = prop.name
+        otherlang = None
+        for value in self.view_values(prop):
+            if isinstance(value, Literal):
+                if value.language == 'en' or not value.language:
+                    return None
+                otherlang = value
+            elif isinstance(value, str):
+                return None
+        return str(otherlang) if otherlang is not None else None
+
+    def ensure_english(self, prop, translations=None):
         '''Ensure property prop (a string or ADMSProperty instance) has an
         english translation if it contains a literal value. A literal without
         language tag will be transformed to english. Otherwise, the text of
-        another language will be translated.'''
+        another language will be translated.
+
+        Arguments:
+        prop -- the property
+        translations -- optional dictionary of known translations (see
+                        translate_all)
+        '''
         if isinstance(prop, ADMSProperty):
             prop = prop.name
-        values = self.get_values(prop)
         simple = None
         otherlang = None
-        for value in values:
+        for value in self.view_values(prop):
             if isinstance(value, Literal):
                 if value.language == 'en':
                     return
@@ -380,11 +586,17 @@ class ADMSResource:
                     simple = value
             elif isinstance(value, str):
                 simple = value
+        values = self.get_values(prop)
         if simple is not None:
             values.remove(simple)
             values.add(Literal(str(simple), lang="en"))
         elif otherlang is not None:
-            values.add(Literal(translate(str(otherlang)), lang="en"))
+            text = str(otherlang)
+            if translations and text in translations:
+                translation = translations[text]
+            else:
+                translation = translate(text)
+            values.add(Literal(translation, lang="en"))
         if len(values) == 1:
             values = values.pop()
         setattr(self, prop, values)
@@ -398,6 +610,8 @@ class ADMSResource:
         '''
         if result is None:
             result = ValidationResult()
+            if deep:
+                result.check_links([self])
         if self in result.checked:
             return result
         result.checked.add(self)
@@ -440,9 +654,13 @@ def adms_resource(*uris, also=None):
         for uri in parse_uris:
             assert uri not in ADMS_RESOURCES
             ADMS_RESOURCES[uri] = cls
-        for name, prop in cls.properties():
+        cls.PROPERTIES = tuple((name, prop)
+                               for name, prop in cls.__dict__.items()
+                               if isinstance(prop, ADMSProperty))
+        for index, (name, prop) in enumerate(cls.PROPERTIES):
             prop.name = name
             prop.resource_cls = cls
+            prop.index = index
         return cls
     return f
 
@@ -454,6 +672,27 @@ class ValidationResult:
     def __init__(self):
         self.errors = {}
         self.checked = set()  # set of checked resources
+        self.alive = {}       # liveness of access URLs, indexed by URL
+
+    def check_links(self, resources):
+        '''Check concurrently all access URLs of resources and the resources
+        they depend on, so that validation does not wait for each of them.'''
+        urls = set()
+        seen = set()
+        stack = list(resources)
+        while stack:
+            resource = stack.pop()
+            if resource in seen:
+                continue
+            seen.add(resource)
+            for name, prop in resource.properties():
+                for value in resource.view_values(prop):
+                    if isinstance(value, ADMSResource):
+                        stack.append(value)
+                    elif prop.rng == ADMSProperty.ACCESSURL and \
+                         isinstance(value, URIRef):
+                        urls.add(str(value))
+        self.alive.update(check_alive(urls - set(self.alive)))
 
     def __bool__(self):
         return not self.errors
@@ -486,6 +725,181 @@ def validate(resources):
         return resources.validate()
     else:
         result = ValidationResult()
+        result.check_links(resources)
         for resource in resources:
             resource.validate(result=result)
         return result
+
+
+## Streaming serialization
+#
+# The serializers below write the statements of ADMSResources directly to a
+# file, one subject at a time, without building an rdflib graph.
+
+def iter_statements(resources):
+    '''Yield the statements of resources and all depending ones, grouped by
+    subject, as (subject, [(predicate, object), ...]) tuples.'''
+    if isinstance(resources, ADMSResource):
+        resources = [resources]
+    memo = set()
+    stack = list(resources)
+    while stack:
+        resource = stack.pop()
+        if resource.uri in memo:
+            continue
+        memo.add(resource.uri)
+        pairs = [(RDF.type, type_uri) for type_uri in resource.TYPE_URIS]
+        inverse = []
+        for name, prop in resource.properties():
+            for value in resource.view_values(prop):
+                if isinstance(value, ADMSResource):
+                    stack.append(value)
+                obj = prop._to_rdf(value)
+                pairs.extend((uri, obj) for uri in prop.uris)
+                if isinstance(obj, (URIRef, BNode)):
+                    inverse.extend((obj, [(uri, resource.uri)])
+                                   for uri in prop.inv)
+        yield (resource.uri, pairs)
+        yield from inverse
+
+
+@functools.lru_cache(maxsize=1024)
+def split_uri(uri):
+    '''Split uri into a namespace and an XML local name, after its last '#'
+    or '/'. Return None if there is no valid local name.'''
+    i = max(uri.rfind('#'), uri.rfind('/')) + 1
+    if i == 0 or not XML_LOCAL_NAME.match(uri, i):
+        return None
+    return uri[:i], uri[i:]
+
+XML_LOCAL_NAME = re.compile(r"[A-Za-z_](?:[\w.-]*[\w-])?$")
+
+
+def quote_literal(literal):
+    '''Return the N-Triples representation of the lexical form of literal.'''
+    return '"' + str(literal).replace('\\', '\\\\').replace('"', '\\"') \
+                             .replace('\n', '\\n').replace('\r', '\\r') + '"'
+
+
+class TermWriter:
+
+    '''Write terms in the N-Triples or Turtle syntax.
+
+    Attributes:
+    prefixes -- a dictionary of prefixes indexed by namespace, used to
+                abbreviate URIs; empty for N-Triples
+    '''
+
+    def __init__(self, prefixes=None):
+        self.prefixes = prefixes or {}
+
+    def uri(self, uri):
+        if self.prefixes:
+            parts = split_uri(uri)
+            if parts and parts[0] in self.prefixes:
+                return self.prefixes[parts[0]] + ':' + parts[1]
+        return '<' + str(uri) + '>'
+
+    def node(self, node):
+        if isinstance(node, BNode):
+            return '_:' + str(node)
+        return self.uri(node)
+
+    def term(self, term):
+        if isinstance(term, Literal):
+            result = quote_literal(term)
+            if term.language:
+                result += '@' + term.language
+            elif term.datatype:
+                result += '^^' + self.uri(term.datatype)
+            return result
+        else:
+            return self.node(term)
+
+
+def write_ntriples(resources, f):
+    '''Write resources and all depending ones to the text file f in the
+    N-Triples format.'''
+    writer = TermWriter()
+    for subject, pairs in iter_statements(resources):
+        subject = writer.node(subject)
+        for predicate, obj in pairs:
+            f.write(subject + ' ' + writer.uri(predicate) + ' ' +
+                    writer.term(obj) + ' .\n')
+
+
+def write_turtle(resources, f):
+    '''Write resources and all depending ones to the text file f in the
+    Turtle format.'''
+    writer = TermWriter({str(namespace):prefix
+                         for prefix, namespace in NAMESPACES})
+    for prefix, namespace in NAMESPACES:
+        f.write('@prefix ' + prefix + ': <' + str(namespace) + '> .\n')
+    for subject, pairs in iter_statements(resources):
+        objects = {}
+        for predicate, obj in pairs:
+            objects.setdefault(predicate, []).append(writer.term(obj))
+        f.write('\n' + writer.node(subject))
+        f.write(' ;'.join('\n    ' +
+                          ('a' if predicate == RDF.type
+                               else writer.uri(predicate)) +
+                          ' ' + ', '.join(values)
+                          for predicate, values in objects.items()))
+        f.write(' .\n')
+
+
+def rdfxml_node(attr, node):
+    '''Return the RDF/XML attribute referring to node: attr for a URI, or
+    rdf:nodeID for a blank node.'''
+    if isinstance(node, BNode):
+        attr = 'rdf:nodeID'
+    return attr + '=' + xml.sax.saxutils.quoteattr(str(node))
+
+
+def write_rdfxml(resources, f):
+    '''Write resources and all depending ones to the text file f in the
+    RDF/XML format.'''
+    quote = xml.sax.saxutils.quoteattr
+    prefixes = {str(namespace):prefix for prefix, namespace in NAMESPACES}
+    f.write('<?xml version="1.0" encoding="UTF-8"?>\n<rdf:RDF')
+    for prefix, namespace in NAMESPACES:
+        f.write('\n   xmlns:' + prefix + '=' + quote(str(namespace)))
+    f.write('>\n')
+    for subject, pairs in iter_statements(resources):
+        f.write('  <rdf:Description ' + rdfxml_node('rdf:about', subject) +
+                '>\n')
+        for predicate, obj in pairs:
+            namespace, name = split_uri(predicate)
+            if namespace in prefixes:
+                tag = prefixes[namespace] + ':' + name
+                attrs = ''
+            else:
+                tag = 'ns:' + name
+                attrs = ' xmlns:ns=' + quote(namespace)
+            if isinstance(obj, Literal):
+                if obj.language:
+                    attrs += ' xml:lang=' + quote(obj.language)
+                elif obj.datatype:
+                    attrs += ' rdf:datatype=' + quote(str(obj.datatype))
+                f.write('    <' + tag + attrs + '>' +
+                        xml.sax.saxutils.escape(str(obj)) +
+                        '</' + tag + '>\n')
+            else:
+                f.write('    <' + tag + attrs + ' ' +
+                        rdfxml_node('rdf:resource', obj) + '/>\n')
+        f.write('  </rdf:Description>\n')
+    f.write('</rdf:RDF>\n')
+
+
+SERIALIZERS = {'xml': write_rdfxml, 'turtle': write_turtle,
+               'nt': write_ntriples}
+
+def serialize(resources, f, format='xml'):
+    '''Write resources and all depending ones to the binary file f in format
+    (one of the keys of SERIALIZERS), without building a graph.'''
+    text = io.TextIOWrapper(f, encoding='utf-8', newline='\n')
+    try:
+        SERIALIZERS[format](resources, text)
+    finally:
+        text.flush()
+        text.detach()
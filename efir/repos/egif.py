@@ -24,6 +24,9 @@ import mimetypes
 
 BASE_URL = "http://www.yap.gov.gr/e-gif/schemas/current/"
 
+# Time zone of the directory listings
+TIMEZONE = EuropeanTimezone(2, "EET", "EEST")
+
 TITLE = "Greek Interoperability Catalogue"
 DESCRIPTION = "The Greek Interoperability Catalogue contains assets produced by Greek public administration that can be used for the development of e-government services."
 
@@ -72,10 +75,17 @@ def process_section(repo, section):
     asset.type = section.asset_type
     asset.interoperabilityLevel = InteroperabilityLevel.Semantic
     asset.distribution = set()
-    for url in HTMLPage(section.url).get_child_links():
+    entries = []
+    page = HTMLPage(section.url)
+    for url, size, mtime in page.get_directory_listing(TIMEZONE):
         m = re.match(section.pattern, url)
-        if not m:
-            continue
+        if m:
+            entries.append((m, size, mtime))
+    # Fetch at once the modification dates missing from the listing
+    prefetch((m.group(0) for m, size, mtime in entries if mtime is None),
+             headers_only=True)
+    for m, size, mtime in entries:
+        url = m.group(0)
         name, version = m.group('name'), m.group('version')
         name = unquote(name)
         name = re.sub(r"([a-z])([A-Z])", r"\1 \2", name)
@@ -84,7 +94,9 @@ def process_section(repo, section):
         d = AssetDistribution(URIRef(url))
         d.accessURL = d.uri
         d.title = Literal(name, lang="en")
-        d.modified = get_modified(url)
+        d.modified = mtime or get_modified(url)
+        if size:
+            d.fileSize = Literal(size)
         d.issued = d.modified
         d.status = asset.status
         d.format = MediaType.term("application/xml")
@@ -44,14 +44,16 @@ for data in read_csv("urlfixes.csv"):
 
 def get_asset_uris():
     '''Yield the URIRefs of all assets.'''
-    home = HTMLPage(URL)
+    home = HTMLPage(URL, parse_only=SoupStrainer('table',
+                                                 summary="overzichtstabel"))
     table = home.find('table', summary="overzichtstabel")
     for tr in table.tbody.find_all('tr'):
         yield URIRef(urljoin(URL, tr.a['href']))
 
 
-def get_items(page, name):
-    '''Return the contents of the field named name on the HTMLPage page.
+def get_fields(page):
+    '''Return a dictionary mapping the names of the fields of the HTMLPage
+    page to their tags, collected in one traversal of the page.
     The fields are formatted as follows on the page:
         <div class="field-field-name">
           <div class="field-label">...</div>
@@ -61,34 +63,45 @@ def get_items(page, name):
             ...
           </div>
         </div>
+    '''
+    fields = {}
+    for tag in page.find_all(class_=True):
+        for cls in tag['class']:
+            if cls.startswith("field-field-"):
+                fields.setdefault(cls[12:], tag)
+    return fields
+
+
+def get_items(fields, name):
+    '''Return the contents of the field named name (see get_fields).
     The result is a list of items (the field-item tags).
     '''
-    div = page.find(class_="field-field-"+name)
+    div = fields.get(name)
     if div is None:
         return []
     return div.find_all(class_="field-item")
 
 
-def get_text(page, name):
-    '''Return a list of text values for field named name on page.'''
-    return [html_to_plain(item) for item in get_items(page, name)]
+def get_text(fields, name):
+    '''Return a list of text values for field named name.'''
+    return [html_to_plain(item) for item in get_items(fields, name)]
 
 
-def get_fulltext(page, name):
-    '''Return the text value of field named name on page.'''
-    return "\n".join(get_text(page, name))
+def get_fulltext(fields, name):
+    '''Return the text value of field named name.'''
+    return "\n".join(get_text(fields, name))
 
 
-def get_uris(page, name):
-    '''Return the set of URI values of field named name on page.'''
+def get_uris(fields, name):
+    '''Return the set of URI values of field named name.'''
     return set(URIRef(urljoin(URL, a['href']))
-               for item in get_items(page, name)
+               for item in get_items(fields, name)
                for a in item.find_all('a'))
 
 
-def get_date(page, name):
-    '''Return the datetime value of field named name on page.'''
-    items = get_items(page, name)
+def get_date(fields, name):
+    '''Return the datetime value of field named name.'''
+    items = get_items(fields, name)
     if not items:
         return None
     if len(items) > 1:
@@ -109,13 +122,14 @@ def get_asset(uri):
     '''Generate the asset with URI uri.'''
     logging.debug("Parsing asset %s.", uri)
     page = HTMLPage(str(uri))
+    fields = get_fields(page)
     asset = Asset(uri)
     title = ", ".join(line.strip("* ")
-                      for line in get_fulltext(page, "full-name").split("\n")
+                      for line in get_fulltext(fields, "full-name").split("\n")
                       if line.strip("* "))
     asset.title = Literal(title, lang="en")
     asset.altLabel = Literal(page.find(class_="title").text.strip(), lang="en")
-    description_nl = get_fulltext(page, "beschrijving")
+    description_nl = get_fulltext(fields, "beschrijving")
     if uri in DESCRIPTIONS:
         description_en = DESCRIPTIONS[uri]
     else:
@@ -123,24 +137,24 @@ def get_asset(uri):
     asset.description = {Literal(description_nl, lang="nl"),
                          Literal(description_en, lang="en")}
     asset.status = Status.Completed
-    asset.modified = get_date(page, "datum-opname") or get_modified(str(uri))
+    asset.modified = get_date(fields, "datum-opname") or get_modified(str(uri))
     asset.version = set(Literal(text, lang="en")
-                        for text in get_text(page, "version") if text != "-")
+                        for text in get_text(fields, "version") if text != "-")
     asset.language = Language.nl
     asset.publisher = PUBLISHER
     asset.type = AssetType.TechnicalInteropabilityAgreement
     asset.theme = Eurovoc.term("100223")
     asset.interoperabilityLevel = set()
-    for level in get_text(page, "interoperabiliteitsniveau"):
+    for level in get_text(fields, "interoperabiliteitsniveau"):
         if level == "Process":
             asset.interoperabilityLevel.add(InteroperabilityLevel.Organisational)
         elif level.startswith("Techniek"):
             asset.interoperabilityLevel.add(InteroperabilityLevel.Technical)
         elif level.startswith("Betekenis") or level.startswith("Structuur"):
             asset.interoperabilityLevel.add(InteroperabilityLevel.Semantic)
-    asset.related = get_uris(page, "relation")
+    asset.related = get_uris(fields, "relation")
     uris = set()
-    for uri in get_uris(page, "specificatie"):
+    for uri in get_uris(fields, "specificatie"):
         if uri in URL_FIXES:
             uris |= URL_FIXES[uri]
         else:
@@ -171,8 +185,11 @@ def process():
     repo.description = Literal(DESCRIPTION, lang="en")
     repo.modified = get_modified(URL)
     repo.spatial = GeoNames.term("2750405")
-    repo.dataset = {get_asset(uri) for uri in get_asset_uris()}
-    repo.dataset.update(get_asset(URIRef(data["URI"]))
-                        for data in read_csv("additional_assets.csv"))
+    uris = list(get_asset_uris())
+    uris.extend(URIRef(data["URI"])
+                for data in read_csv("additional_assets.csv"))
+    prefetch(uris)
+    # Parse the asset pages in parallel
+    repo.dataset = set(map_processes(get_asset, uris))
     repo.publisher = PUBLISHER
     return repo
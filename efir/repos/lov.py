@@ -19,121 +19,100 @@
 # permissions and limitations under the Licence.
 
 from .. import *
+import isodate
 
 URL = "http://lov.okfn.org/dataset/lov/lov.rdf"
 
 TITLE = "Linked Open Vocabularies"
 DESCRIPTION = "LOV objective is to provide easy access methods to this ecosystem of vocabularies, and in particular by making explicit the ways they link to each other and providing metrics on how they are used in the linked data cloud, help to improve their understanding, visibility and usability, and overall quality."
 
-CONSTRUCT = """
-PREFIX voaf: <http://purl.org/vocommons/voaf#>
-PREFIX bibo: <http://purl.org/ontology/bibo/>
+VOAF = rdflib.Namespace("http://purl.org/vocommons/voaf#")
+BIBO = rdflib.Namespace("http://purl.org/ontology/bibo/")
 
-CONSTRUCT {
-  ?asset a adms:Asset .
-  ?asset dcterms:title ?title .
-  ?asset dcterms:alternative ?shortTitle .
-  ?asset adms:status <http://purl.org/adms/status/Completed> .
-  ?asset dcterms:description ?description .
-  ?asset dcterms:issued ?issued .
-  ?asset dcterms:modified ?modified .
-  ?asset dcterms:type <http://purl.org/adms/assettype/Ontology> .
-  ?asset radion:distribution ?d .
-  ?asset dcterms:relation ?extends .
-  ?asset dcterms:relation ?specializes .
-  ?asset dcterms:relation ?reliesOn .
-  ?asset dcterms:relation ?usedBy .
-  ?asset dcterms:relation ?generalizes .
-  ?asset dcterms:relation ?hasEquivalencesWith .
-  ?asset dcterms:relation ?hasDisjunctionsWith .
-  ?asset dcterms:relation ?similar .
+W3C = URIRef("http://www.w3.org/data#W3C")
 
-  ?d a adms:AssetDistribution .
-  ?d dcat:accessURL ?asset .
-  ?d dcterms:title ?title .
-  ?d adms:status <http://purl.org/adms/status/Completed> .
-  ?d dcterms:format <http://purl.org/NET/mediatypes/text/html> .
-  ?d adms:representationTechnique <http://purl.org/adms/representationtechnique/HumanLanguage> .
-  ?d dcterms:publisher ?publisher, ?creator .
-  ?d dcterms:issued ?issued .
-  ?d dcterms:modified ?modified .
-} WHERE {
-  ?voc rdf:type voaf:Vocabulary ;
-       dcterms:title ?title .
-  FILTER NOT EXISTS { ?voc dcterms:publisher <http://www.w3.org/data#W3C> }
-  OPTIONAL { ?voc dcterms:description ?description }
-  OPTIONAL { ?voc dcterms:modified ?modified }
-  OPTIONAL { ?voc dcterms:issued ?issued }
-  OPTIONAL { ?voc bibo:shortTitle ?shortTitle }
-  OPTIONAL { ?voc voaf:extends ?extends }
-  OPTIONAL { ?voc voaf:specializes ?specializes }
-  OPTIONAL { ?voc voaf:reliesOn ?reliesOn }
-  OPTIONAL { ?voc voaf:usedBy ?usedBy }
-  OPTIONAL { ?voc voaf:generalizes ?generalizes }
-  OPTIONAL { ?voc voaf:hasEquivalencesWith ?hasEquivalencesWith }
-  OPTIONAL { ?voc voaf:hasDisjunctionsWith ?hasDisjunctionsWith }
-  OPTIONAL { ?voc voaf:similar ?similar }
-  BIND(IRI(REPLACE(str(?voc), "[/#]*$", "")) AS ?asset)
-  BIND(IRI(CONCAT(str(?asset), "?type=distribution")) AS ?d)
-}
-"""
+# Properties of vocabularies mapped to dcterms:relation
+RELATIONS = [VOAF.extends, VOAF.specializes, VOAF.reliesOn, VOAF.usedBy,
+             VOAF.generalizes, VOAF.hasEquivalencesWith,
+             VOAF.hasDisjunctionsWith, VOAF.similar]
 
-QUERIES = [
-# Ensure all text fields have a language tag
-"""
-DELETE {
-  ?s ?p ?o
-} INSERT {
-  ?s ?p ?olang
-} WHERE {
-  ?s ?p ?o
-  FILTER(?p IN (foaf:name, dcterms:title, dcterms:description))
-  FILTER(lang(?o) = "")
-  BIND(STRLANG(?o, "en") AS ?olang)
-}
-""",
-# Fix dates
-# Note: a bug in the implementation of the CONCAT function in rdflib prevents
-# to combine those two queries.
-"""
-DELETE {
-  ?s dcterms:modified ?str
-} INSERT {
-  ?s dcterms:modified ?date
-} WHERE {
-  ?s dcterms:modified ?str
-  BIND(xsd:dateTime(CONCAT(?str, "T00:00:00+00:00")) AS ?date)
-}
-""",
-"""
-DELETE {
-  ?s dcterms:issued ?str
-} INSERT {
-  ?s dcterms:issued ?date
-} WHERE {
-  ?s dcterms:issued ?str
-  BIND(xsd:dateTime(CONCAT(?str, "T00:00:00+00:00")) AS ?date)
-}
-""",
-# Generate missing descriptions
-"""
-INSERT {
-  ?asset dcterms:description "The description of this asset is not available"@en
-} WHERE {
-  ?asset a adms:Asset
-  FILTER NOT EXISTS { ?asset dcterms:description ?description }
-}
-"""
-]
+MISSING_DESCRIPTION = Literal("The description of this asset is not available",
+                              lang="en")
+
+
+def get_text(value):
+    '''Return the text value with a language tag (english by default), or
+    None if it is a typed literal.'''
+    if isinstance(value, Literal) and not value.language:
+        if value.datatype:
+            return None
+        return Literal(str(value), lang="en")
+    return value
+
+
+def get_date(value):
+    '''Return the xsd:dateTime literal of the date value (a simple literal),
+    or None if value is not a valid date.'''
+    if not isinstance(value, Literal) or \
+       value.datatype not in {None, XSD.string}:
+        return None
+    try:
+        return Literal(isodate.parse_datetime(str(value) + "T00:00:00+00:00"),
+                       datatype=XSD.dateTime)
+    except (ValueError, isodate.ISO8601Error):
+        return None
+
+
+def get_adms_graph(g, uris):
+    '''Return the graph of the ADMS assets of the vocabularies of LOV graph g
+    with an asset URI in uris, without the vocabularies of the W3C.'''
+    adms = Graph()
+    for voc in set(g.subjects(RDF.type, VOAF.Vocabulary)):
+        asset = URIRef(voc.rstrip("/#"))
+        if asset not in uris or g.value(voc, DCTERMS.title) is None or \
+           (voc, DCTERMS.publisher, W3C) in g:
+            continue
+        d = URIRef(asset + "?type=distribution")
+        adms.add((asset, RDF.type, ADMS.Asset))
+        adms.add((asset, ADMS.status, Status.Completed))
+        adms.add((asset, DCTERMS.type, AssetType.Ontology))
+        adms.add((asset, RADION.distribution, d))
+        adms.add((d, RDF.type, ADMS.AssetDistribution))
+        adms.add((d, DCAT.accessURL, asset))
+        adms.add((d, ADMS.status, Status.Completed))
+        adms.add((d, DCTERMS.term("format"),
+                  MediaType.term("text/html")))
+        adms.add((d, ADMS.representationTechnique,
+                  RepresentationTechnique.HumanLanguage))
+        for title in map(get_text, g.objects(voc, DCTERMS.title)):
+            if title is not None:
+                adms.add((asset, DCTERMS.title, title))
+                adms.add((d, DCTERMS.title, title))
+        for description in map(get_text, g.objects(voc, DCTERMS.description)):
+            if description is not None:
+                adms.add((asset, DCTERMS.description, description))
+        for prop in [DCTERMS.issued, DCTERMS.modified]:
+            for date in map(get_date, g.objects(voc, prop)):
+                if date is not None:
+                    adms.add((asset, prop, date))
+                    adms.add((d, prop, date))
+        for title in g.objects(voc, BIBO.shortTitle):
+            adms.add((asset, DCTERMS.alternative, title))
+        for prop in RELATIONS:
+            for related in g.objects(voc, prop):
+                adms.add((asset, DCTERMS.relation, related))
+    for asset in adms.subjects(RDF.type, ADMS.Asset):
+        if adms.value(asset, DCTERMS.description) is None:
+            adms.add((asset, DCTERMS.description, MISSING_DESCRIPTION))
+    return adms
 
 
 def process():
     g = Graph.load(URL, format='xml')
+    rows = list(read_csv("assets.csv"))
     logging.debug("Constructing ADMS graph")
-    adms = g.query(CONSTRUCT).graph
-    for query in QUERIES:
-        logging.debug("Running update query %s", query)
-        adms.update(query)
+    adms = get_adms_graph(g, {URIRef(data["URI"].rstrip("/#"))
+                              for data in rows})
     logging.debug("Extracting assets.")
     assets = {asset.uri:asset for asset in adms.extract_all(Asset)}
     logging.debug("Reading publishers.")
@@ -150,7 +129,7 @@ def process():
     repo.modified = get_modified(URL)
     repo.accessURL = repo.uri
     repo.dataset = set()
-    for data in read_csv("assets.csv"):
+    for data in rows:
         uri = URIRef(data["URI"].rstrip("/#"))
         if uri in assets:
             asset = assets[uri]
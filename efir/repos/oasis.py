@@ -58,12 +58,43 @@ def get_date(tag):
     return None
 
 
-def get_distribution_name(a):
-    '''Return the guessed distribution name of link a.'''
+class LinkIndex:
+
+    '''Index of the links of a page, built in one pass.
+
+    Attributes:
+    links -- dictionary mapping each href to the first link having it
+    counts -- dictionary mapping the id of each tag to its number of
+              descendant links
+    '''
+
+    def __init__(self, page):
+        self.links = {}
+        self.counts = collections.Counter()
+        for a in page.find_all('a', href=True):
+            self.links.setdefault(a['href'], a)
+            for parent in a.parents:
+                self.counts[id(parent)] += 1
+
+    def find(self, href):
+        '''Return the first link to href, or None.'''
+        return self.links.get(href)
+
+    def count(self, tag):
+        '''Return the number of links contained in tag.'''
+        return self.counts[id(tag)]
+
+
+def get_distribution_name(a, index):
+    '''Return the guessed distribution name of link a.
+
+    Arguments:
+    a -- the link
+    index -- the LinkIndex of the page
+    '''
     # Find outermost tag containing only this link
     tag = a
-    while tag.name not in {'li', 'td'} and \
-          len(tag.parent.find_all('a', href=True)) < 2:
+    while tag.name not in {'li', 'td'} and index.count(tag.parent) < 2:
         tag = tag.parent
     # Three words or more, or part of sentence, or filename: this is the name
     name = clean_text(a.text, oneline=True)
@@ -101,12 +132,17 @@ def get_asset_rows(page):
     return table.find_all('tr')[1:]
 
 
-def get_asset(page, tr):
-    '''Generate the asset from row tr.'''
+def get_asset(index, tr):
+    '''Generate the asset from row tr.
+
+    Arguments:
+    index -- the LinkIndex of the page
+    tr -- the row
+    '''
     standard, producer, approved = tr.find_all('td')
     for a in standard.find_all('a', attrs={'name':True}):
         name = a.attrs["name"]
-        link = page.find('a', href='#'+name)
+        link = index.find('#' + name)
         if link:
             title = link.text
             break
@@ -125,7 +161,8 @@ def get_asset(page, tr):
         d = AssetDistribution(URIRef(urljoin(URL, a['href'])))
         d.accessURL = d.uri
         d.status = asset.status
-        d.title = Literal(get_distribution_name(a), lang="en")
+        d.title = Literal(get_distribution_name(a, index),
+                          lang="en")
         d.license = LICENSE
         mime = mimetypes.guess_type(str(d.accessURL))[0]
         if mime:
@@ -140,12 +177,13 @@ def get_asset(page, tr):
 
 
 def process():
-    page = HTMLPage(URL)
+    page = HTMLPage(URL, parse_only=class_strainer("node-inner"))
     repo = Repository(URIRef(URL))
     repo.accessURL = URIRef(URL)
     repo.title = Literal(TITLE, lang="en")
     repo.description = Literal(DESCRIPTION, lang="en")
     repo.publisher = PUBLISHER
     repo.modified = get_modified(URL)
-    repo.dataset = {get_asset(page, row) for row in get_asset_rows(page)}
+    index = LinkIndex(page)
+    repo.dataset = {get_asset(index, row) for row in get_asset_rows(page)}
     return repo
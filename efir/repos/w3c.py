@@ -98,19 +98,15 @@ INSERT DATA {
 
 def get_abstract(url):
     '''Try to fetch the abstract in url.'''
+    page = HTMLPage(url)
     # First try RDF-a
-    try:
-        g = Graph.load(url, format='rdfa')
-        abstract = g.value(URIRef(url), DCTERMS.abstract)
-        if abstract:
-            abstract = abstract.strip()
-            if abstract.startswith("Abstract\n"):
-                abstract = abstract[9:].strip()
-            return abstract
-    except:
-        pass
+    abstract = page.get_rdfa_value(str(DCTERMS.abstract))
+    if abstract:
+        abstract = abstract.strip()
+        if abstract.startswith("Abstract\n"):
+            abstract = abstract[9:].strip()
+        return abstract
     # Fallback to HTML scraping
-    page = HTMLPage(url)
     for title in ["Abstract", "Introduction", "About the meeting",
                   "Status of this document"]:
         text = page.get_section_text(title)
@@ -126,15 +122,17 @@ def process():
     logging.debug("Extracting repository.")
     repo = g.extract(URIRef("http://www.w3.org/TR/"))
     repo.modified = get_modified(URL)
+    assets = [asset for asset in repo.dataset if not asset.description]
+    prefetch(str(asset.uri) for asset in assets)
+    abstracts = map_processes(get_abstract,
+                              (str(asset.uri) for asset in assets))
     fetched = 0
-    for asset in repo.dataset:
-        if not asset.description:
-            abstract = get_abstract(str(asset.uri))
-            if abstract:
-                asset.description = Literal(abstract, lang="en")
-                fetched += 1
-            else:
-                logging.warning("No description for %s", asset.uri)
-                asset.description = Literal("The description of this asset is not available", lang="en")
+    for asset, abstract in zip(assets, abstracts):
+        if abstract:
+            asset.description = Literal(abstract, lang="en")
+            fetched += 1
+        else:
+            logging.warning("No description for %s", asset.uri)
+            asset.description = Literal("The description of this asset is not available", lang="en")
     logging.info("Fetched %d descriptions.", fetched)
     return repo
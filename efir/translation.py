@@ -19,28 +19,195 @@
 # permissions and limitations under the Licence.
 
 from .files import *
+import abc
+import atexit
 import goslate
 
+TRANSLATIONS_DB = os.path.join(CACHE_DIR, "translations.sqlite")
+TRANSLATIONS_CSV = os.path.join(CACHE_DIR, "translations.csv")
 
-def translate(text):
-    '''Return text translated to english.'''
-    # Initialize cache
-    if not hasattr(translate, 'cache'):
-        translate.filename = os.path.join(CACHE_DIR, "translations.csv")
-        translate.translator = goslate.Goslate()
-        os.makedirs(os.path.dirname(translate.filename), exist_ok=True)
-        if os.path.exists(translate.filename):
-            logging.debug("Reading cached translations.")
-            with open(translate.filename) as f:
-                translate.cache = {row[0]:row[1] for row in csv.reader(f)}
-        else:
-            translate.cache = {}
-    # Translate if not in cache
-    if text not in translate.cache:
-        logging.debug("Translating %s", text)
-        translation = translate.translator.translate(text, 'en')
-        with open(translate.filename, 'a') as f:
-            csv.writer(f).writerow([text, translation])
-        translate.cache[text] = translation
-    # Return cached result
-    return translate.cache[text]
+TRANSLATIONS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS translations (
+  key TEXT NOT NULL,
+  lang TEXT NOT NULL,
+  source TEXT NOT NULL,
+  translation TEXT NOT NULL,
+  PRIMARY KEY (key, lang)
+);
+"""
+
+# Number of new translations kept in memory before being written
+BATCH_SIZE = 50
+
+
+class TranslationStore:
+
+    '''Persistent store of translations.
+
+    Translations are indexed by the hash of the source text and the target
+    language, and are looked up one at a time. New translations are written
+    in batches, each one in a single transaction.
+    '''
+
+    def __init__(self, filename=TRANSLATIONS_DB):
+        self.filename = filename
+        self.pending = {}
+        self.lock = threading.Lock()
+        if not os.path.exists(filename) and os.path.exists(TRANSLATIONS_CSV):
+            self.import_csv(TRANSLATIONS_CSV)
+
+    def connect(self):
+        return connect_db(self.filename, TRANSLATIONS_SCHEMA)
+
+    @staticmethod
+    def key(text, lang):
+        return (hashlib.sha1(text.encode('utf-8')).hexdigest(), lang)
+
+    def get(self, text, lang='en'):
+        '''Return the translation of text to lang, or None if unknown.'''
+        key = self.key(text, lang)
+        with self.lock:
+            if key in self.pending:
+                return self.pending[key][1]
+        row = self.connect().execute("SELECT translation FROM translations "
+                                     "WHERE key = ? AND lang = ?",
+                                     key).fetchone()
+        return row[0] if row else None
+
+    def put(self, text, translation, lang='en'):
+        '''Add the translation of text to lang.'''
+        with self.lock:
+            self.pending[self.key(text, lang)] = (text, translation)
+            full = len(self.pending) >= BATCH_SIZE
+        if full:
+            self.flush()
+
+    def flush(self):
+        '''Write the pending translations.'''
+        with self.lock:
+            pending, self.pending = self.pending, {}
+        if not pending:
+            return
+        logging.debug("Writing %d translations.", len(pending))
+        db = self.connect()
+        with db:
+            db.execute("BEGIN IMMEDIATE")
+            db.executemany("INSERT OR REPLACE INTO translations "
+                           "VALUES (?, ?, ?, ?)",
+                           [key + value for key, value in pending.items()])
+
+    def import_csv(self, filename):
+        '''Import the translations to english of a CSV file.'''
+        logging.debug("Importing cached translations from %s.", filename)
+        with open(filename) as f:
+            for row in csv.reader(f):
+                self.put(row[0], row[1])
+        self.flush()
+
+
+class Translator(abc.ABC):
+
+    '''Base class of translation backends.
+
+    Attributes:
+    persistent -- if True, the translations are authoritative and are kept in
+                  the translation store
+    '''
+
+    persistent = True
+
+    @abc.abstractmethod
+    def translate(self, texts, lang='en'):
+        '''Return the list of translations of texts to lang.'''
+
+
+class GoogleTranslator(Translator):
+
+    '''Translator using Google Translate through goslate, which groups
+    texts in batches and fetches them concurrently.
+
+    Arguments:
+    max_workers -- maximum number of concurrent requests
+    '''
+
+    def __init__(self, max_workers=MAX_WORKERS):
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers)
+        self.goslate = goslate.Goslate(executor=executor)
+
+    def translate(self, texts, lang='en'):
+        return list(self.goslate.translate(texts, lang))
+
+
+class OfflineTranslator(Translator):
+
+    '''Translator working without network access, for tests. Texts are
+    returned unchanged, with an optional prefix. Its translations are not
+    kept in the translation store.
+
+    Arguments:
+    prefix -- string prepended to every translation
+    '''
+
+    persistent = False
+
+    def __init__(self, prefix=''):
+        self.prefix = prefix
+
+    def translate(self, texts, lang='en'):
+        return [self.prefix + text for text in texts]
+
+
+def set_translator(translator):
+    '''Set the Translator used for texts missing in the store.'''
+    global TRANSLATOR
+    TRANSLATOR = translator
+
+
+def get_translator():
+    '''Return the current Translator, by default a GoogleTranslator.'''
+    if 'TRANSLATOR' not in globals():
+        set_translator(GoogleTranslator())
+    return TRANSLATOR
+
+
+def get_store():
+    '''Return the translation store, creating it if needed.'''
+    global STORE
+    if 'STORE' not in globals():
+        STORE = TranslationStore()
+        atexit.register(STORE.flush)
+    return STORE
+
+
+def flush_translations():
+    '''Write the pending translations, if any.'''
+    if 'STORE' in globals():
+        STORE.flush()
+
+
+def translate_all(texts, lang='en'):
+    '''Translate texts to lang (english by default) and return a dictionary
+    mapping each text to its translation. Texts that are not in the store are
+    translated together in one batch.'''
+    store = get_store()
+    translations = {}
+    missing = []
+    for text in texts:
+        if text not in translations:
+            translations[text] = store.get(text, lang)
+            if translations[text] is None:
+                missing.append(text)
+    if missing:
+        logging.debug("Translating %d texts.", len(missing))
+        translator = get_translator()
+        for text, translation in zip(missing,
+                                     translator.translate(missing, lang)):
+            if translator.persistent:
+                store.put(text, translation, lang)
+            translations[text] = translation
+    return translations
+
+
+def translate(text, lang='en'):
+    '''Return text translated to lang (english by default).'''
+    return translate_all([text], lang)[text]
@@ -0,0 +1,94 @@
+# Tests of the cache module
+#
+# Copyright 2014 PwC EU Services
+#
+# Licensed under the EUPL, Version 1.1 or - as soon they
+# will be approved by the European Commission - subsequent
+# versions of the EUPL (the "Licence");
+# You may not use this work except in compliance with the
+# Licence.
+# You may obtain a copy of the Licence at:
+# http://ec.europa.eu/idabc/eupl
+#
+# Unless required by applicable law or agreed to in
+# writing, software distributed under the Licence is
+# distributed on an "AS IS" basis,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied.
+# See the Licence for the specific language governing
+# permissions and limitations under the Licence.
+
+import os
+import os.path
+import tempfile
+import time
+import unittest
+
+from efir import files
+from efir.files import *
+
+
+class LegacyCacheTest(unittest.TestCase):
+
+    '''Import of the legacy cache layout next to stale index entries.'''
+
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.tmpdir = tempfile.TemporaryDirectory()
+        os.chdir(self.tmpdir.name)
+        # Connections are indexed by relative filename
+        files._connections.__dict__.clear()
+        set_current_module('test')
+        set_cache_ttl(3600)
+
+    def tearDown(self):
+        set_cache_ttl(None)
+        set_current_module(None)
+        files._connections.__dict__.clear()
+        os.chdir(self.cwd)
+        self.tmpdir.cleanup()
+
+    def write_legacy(self, url, suffix, content, age):
+        '''Write a legacy cache file for url, modified age seconds ago.'''
+        filename = get_filename(url) + suffix
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        with open(filename, 'w') as f:
+            f.write(content)
+        mtime = time.time() - age
+        os.utime(filename, (mtime, mtime))
+        return mtime
+
+    def test_import_legacy_entry(self):
+        fresh = "http://example.org/fresh"
+        old = "http://example.org/old"
+        found = "http://example.org/found"
+        mtime = self.write_legacy(fresh, '', "fresh body", 60)
+        self.write_legacy(fresh, '=modified',
+                          "Mon, 06 Jan 2014 10:00:00 GMT", 60)
+        self.write_legacy(old, '', "old body", 7200)
+        found_mtime = self.write_legacy(found, '=found', "", 7200)
+        update_entry("http://example.org/stale", status=200,
+                     fetched=time.time() - 7200)
+
+        entry = get_entry(fresh)
+        self.assertEqual(entry.status, 200)
+        self.assertAlmostEqual(entry.fetched, mtime, places=2)
+        self.assertEqual(entry.modified, "Mon, 06 Jan 2014 10:00:00 GMT")
+        with open(get_blob_filename(entry.blob), 'r') as f:
+            self.assertEqual(f.read(), "fresh body")
+        self.assertFalse(is_stale(entry))
+
+        # Bodies and liveness markers get their age from the legacy files
+        self.assertTrue(is_stale(get_entry(old)))
+        self.assertAlmostEqual(get_entry(found).fetched, found_mtime, places=2)
+        self.assertTrue(is_stale(get_entry(found)))
+        self.assertTrue(is_stale(get_entry("http://example.org/stale")))
+        self.assertIsNone(get_entry("http://example.org/unknown"))
+
+        # Imported entries are read back from the index afterwards
+        os.remove(get_filename(fresh))
+        self.assertEqual(get_entry(fresh), entry)
+
+
+if __name__ == '__main__':
+    unittest.main()
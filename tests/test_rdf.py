@@ -0,0 +1,64 @@
+# Tests of the RDF utilities
+#
+# Copyright 2014 PwC EU Services
+#
+# Licensed under the EUPL, Version 1.1 or - as soon they
+# will be approved by the European Commission - subsequent
+# versions of the EUPL (the "Licence");
+# You may not use this work except in compliance with the
+# Licence.
+# You may obtain a copy of the Licence at:
+# http://ec.europa.eu/idabc/eupl
+#
+# Unless required by applicable law or agreed to in
+# writing, software distributed under the Licence is
+# distributed on an "AS IS" basis,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied.
+# See the Licence for the specific language governing
+# permissions and limitations under the Licence.
+
+import io
+import unittest
+import rdflib
+import rdflib.compare
+
+from rdflib import BNode
+from efir.model import *
+
+
+class SerializeTest(unittest.TestCase):
+
+    '''Round trip of the streaming serializers.'''
+
+    def make_asset(self):
+        '''Return an asset with blank nodes as values.'''
+        asset = Asset(URIRef("http://example.org/asset"))
+        asset.title = Literal("Asset <1> & \"2\"", lang="en")
+        asset.identifier = BNode()
+        asset.temporal = {BNode(), BNode()}
+        asset.modified = Literal("2014-01-06T10:00:00+00:00",
+                                 datatype=XSD.dateTime)
+        distribution = AssetDistribution(URIRef("http://example.org/d"))
+        distribution.title = Literal("Distribution", lang="en")
+        distribution.accessURL = URIRef("http://example.org/asset.xsd")
+        asset.distribution = {distribution}
+        return asset
+
+    def test_round_trip(self):
+        asset = self.make_asset()
+        expected = rdflib.Graph()
+        for triple in Graph(asset):
+            expected.add(triple)
+        self.assertTrue(any(isinstance(o, BNode) for s, p, o in expected))
+        for format in sorted(SERIALIZERS):
+            f = io.BytesIO()
+            serialize(asset, f, format)
+            result = rdflib.Graph()
+            result.parse(data=f.getvalue().decode('utf-8'), format=format)
+            self.assertTrue(rdflib.compare.isomorphic(result, expected),
+                            format)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+# Tests of the translation module
+#
+# Copyright 2014 PwC EU Services
+#
+# Licensed under the EUPL, Version 1.1 or - as soon they
+# will be approved by the European Commission - subsequent
+# versions of the EUPL (the "Licence");
+# You may not use this work except in compliance with the
+# Licence.
+# You may obtain a copy of the Licence at:
+# http://ec.europa.eu/idabc/eupl
+#
+# Unless required by applicable law or agreed to in
+# writing, software distributed under the Licence is
+# distributed on an "AS IS" basis,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied.
+# See the Licence for the specific language governing
+# permissions and limitations under the Licence.
+
+import os
+import tempfile
+import unittest
+
+from efir import files
+from efir import translation
+from efir.model import *
+from efir.translation import *
+
+
+class RecordingTranslator(OfflineTranslator):
+
+    '''OfflineTranslator recording the texts it is asked to translate.'''
+
+    def __init__(self, prefix=''):
+        OfflineTranslator.__init__(self, prefix)
+        self.texts = []
+
+    def translate(self, texts, lang='en'):
+        self.texts.extend(texts)
+        return OfflineTranslator.translate(self, texts, lang)
+
+
+class CleanupTest(unittest.TestCase):
+
+    '''Translation of repository texts with an offline backend.'''
+
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.tmpdir = tempfile.TemporaryDirectory()
+        os.chdir(self.tmpdir.name)
+        # Connections are indexed by relative filename
+        files._connections.__dict__.clear()
+        translation.__dict__.pop('STORE', None)
+        self.translator = RecordingTranslator("[en] ")
+        set_translator(self.translator)
+
+    def tearDown(self):
+        translation.__dict__.pop('TRANSLATOR', None)
+        translation.__dict__.pop('STORE', None)
+        files._connections.__dict__.clear()
+        os.chdir(self.cwd)
+        self.tmpdir.cleanup()
+
+    def test_cleanup(self):
+        repo = Repository(URIRef("http://example.org/repo"))
+        repo.title = Literal("Repository", lang="en")
+        repo.description = Literal("Beschrijving", lang="nl")
+        repo.dataset = set()
+        for i in range(2):
+            asset = Asset(URIRef("http://example.org/asset%d" % i))
+            asset.title = Literal("Titel %d" % i, lang="nl")
+            asset.description = Literal("Beschrijving", lang="nl")
+            repo.dataset.add(asset)
+        repo.cleanup()
+
+        self.assertEqual(sorted(self.translator.texts),
+                         ["Beschrijving", "Titel 0", "Titel 1"])
+        self.assertEqual(set(repo.view_values('description')),
+                         {Literal("Beschrijving", lang="nl"),
+                          Literal("[en] Beschrijving", lang="en")})
+        for asset in repo.view_values('dataset'):
+            i = asset.uri[-1]
+            self.assertIn(Literal("[en] Titel " + i, lang="en"),
+                          asset.view_values('title'))
+            self.assertIn(Literal("[en] Beschrijving", lang="en"),
+                          asset.view_values('description'))
+
+        flush_translations()
+        rows = get_store().connect().execute(
+                "SELECT COUNT(*) FROM translations").fetchone()
+        self.assertEqual(rows[0], 0)
+        self.assertIsNone(get_store().get("Beschrijving"))
+
+
+if __name__ == '__main__':
+    unittest.main()